@@ -0,0 +1,350 @@
+import backtrader as bt
+import custom_indicators
+from custom_functions import *
+from sweep import load_feeds
+import BinaryGenerator as BG
+from indicatorregistry import REGISTRY
+import numpy as np
+import tracemalloc
+import argparse
+import datetime
+import platform
+import inspect
+import json
+import time
+import os
+
+# Indicator Benchmarks and Golden Outputs
+#
+# Times every indicator in custom_indicators.py and every role branch of
+# IndicatorGenerator on each pair, in both runonce and runnext mode, and checks
+# both against golden arrays. The goldens under Data/golden/ are committed:
+# they hold the runonce outputs of the indicators as they were before any
+# of them was optimized, on GOLDEN_PAIRS, so every later change is held to
+# the original numbers. Cases or pairs without a golden are only checked
+# for runonce/runnext agreement. A run is saved as JSON (under the ignored
+# Data/bench/) and can be compared against a stored baseline run: slower
+# cases and outputs that no longer match are reported as regressions.
+
+MODES = ('runonce', 'runnext')
+
+# Pairs the Committed Golden Arrays Cover
+GOLDEN_PAIRS = ('EURUSD', 'USDJPY')
+
+# Deliberate Changes Since the Goldens were Taken - Case -> First Bar Held to the Golden.
+# HeikenAshi assigned addminperiod instead of calling it, so it gave values from the first
+# bar on while reading the bar before it
+GOLDEN_WARMUP = {
+    'HeikenAshi': 1,
+    'exit:heikenashi': 2,
+}
+
+# Representative Params for Each Role Branch of IndicatorGenerator
+ROLE_CASES = [
+    ('baseline', 'kijun', (26,)),
+    ('baseline', 'ma', (bt.ind.SMA, 20)),
+    ('baseline', 'itrend', (20,)),
+    ('baseline', 'fama', (20, 50)),
+    ('baseline', 'mama', (20, 50)),
+    ('baseline', 'laguerre', (48,)),
+    ('baseline', 'alaguerre', (20,)),
+    ('baseline', 'butter', (40, 3)),
+    ('entry', 'itrend', (20,)),
+    ('entry', 'cybercycle', (30,)),
+    ('entry', 'adaptivecybercycle', (30, 9)),
+    ('entry', 'ssl', (20,)),
+    ('entry', 'aroon', (14,)),
+    ('entry', 'ttf', (20,)),
+    ('entry', 'tdfi', (13, 0.05)),
+    ('entry', 'cmf', (20,)),
+    ('entry', 'ash', (9, 2, 0, 0.5, bt.ind.WMA, None, None)),
+    ('entry', 'roof', (48, 10, 2)),
+    ('entry', 'mama', (20, 50)),
+    ('entry', 'dosc', (48,)),
+    ('entry', 'idosc', (48, 2)),
+    ('entry', 'schaff', (20, 50, 10, 0.5)),
+    ('volume', 'cvi', (10, 10)),
+    ('volume', 'tdfi', (13, 0.05)),
+    ('volume', 'wae', (150, 20, 40, 20, 2.0, 3.7)),
+    ('volume', 'squeeze', (10, 2, 10, 1.5, bt.ind.SMA)),
+    ('volume', 'damiani', (13, 20, 40, 100, 1.4, True)),
+    ('exit', 'heikenashi', (2,)),
+    ('exit', 'ssl', (20,)),
+    ('exit', 'itrend', (20,)),
+    ('exit', 'mama', (20, 50)),
+    ('exit', 'dosc', (48,)),
+]
+
+
+def indicator_classes():
+    """
+    Indicator classes defined in custom_indicators.py, in source order
+    """
+    classes = []
+    for cls in vars(custom_indicators).values():
+        # Aliases show up as extra module names for the same class
+        if inspect.isclass(cls) and issubclass(cls, bt.Indicator) and cls.__module__ == custom_indicators.__name__ \
+                and cls not in classes:
+            classes.append(cls)
+    return classes
+
+
+def as_lines(output):
+    # Role branches hand back a line, an indicator or a tuple of them
+    if isinstance(output, tuple):
+        return [line for o in output for line in as_lines(o)]
+    return [output.lines[0]] if isinstance(output, bt.Indicator) else [output]
+
+
+def cases():
+    """
+    Every benchmark case as name -> builder, where builder(ig) returns the lines to record as a
+    dict of label -> line (line names for indicators, positions for role branches)
+    """
+    built = dict()
+    for cls in indicator_classes():
+        built[cls.__name__] = lambda ig, cls=cls: named_lines(cls(ig.data))
+    for role, ind, params in ROLE_CASES:
+        name = '{}:{}'.format(role, ind)
+        method = getattr(BG.IndicatorGenerator, role + '_indicator')
+        built[name] = lambda ig, method=method, ind=ind, params=params: \
+            {str(i): line for i, line in enumerate(as_lines(method(ig, ind, params, plot=False)))}
+    return built
+
+
+def named_lines(ind):
+    # Goldens Match Lines by Name, so Dropping or Reordering Lines Keeps the Others Comparable
+    return {name: getattr(ind.lines, name) for name in ind.lines.getlinealiases()}
+
+
+class BenchStrategy(bt.Strategy):
+    '''
+    Builds a single benchmark case on the data feed and does nothing else
+    '''
+
+    params = (
+        ('builder', None),
+    )
+
+    def __init__(self):
+        self.outputs = self.p.builder(BG.IndicatorGenerator(self.data))
+
+
+def run_case(builder, columns, mode, memory=False):
+    """
+    Times a single case on a single pair
+    :param builder: Case builder (see cases)
+    :param columns: Feed columns (see ArrayData)
+    :param mode: 'runonce' or 'runnext'
+    :param memory: Trace the peak Python memory of the run (slows the run down)
+    :return: (seconds, peak bytes or None, dict of label -> output line array)
+
+    """
+    cerebro = bt.Cerebro(stdstats=False, runonce=mode == 'runonce')
+    cerebro.adddata(ArrayData(dataname=columns))
+    cerebro.addstrategy(BenchStrategy, builder=builder)
+
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    strat = cerebro.run()[0]
+    seconds = time.perf_counter() - t0
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    outputs = {label: np.array(line.array, dtype=np.float64) for label, line in strat.outputs.items()}
+    return seconds, peak, outputs
+
+
+def benchmark(pairs=None, dpath='Data/', golden_dir='Data/golden/', only=None, memory=True, write_golden=False):
+    """
+    Runs every case over every pair in both modes
+    :param pairs: List of pair names (default all files in dpath)
+    :param dpath: Data folder
+    :param golden_dir: Folder of the golden output arrays
+    :param only: Optional list of case names to run
+    :param memory: Measure the peak memory of each case (on the first pair)
+    :param write_golden: Store the runonce outputs of cases that have no golden arrays yet. Only
+                         meant for code whose outputs are the reference (e.g. a new indicator
+                         before it is optimized) - the stored arrays are committed
+    :return: Results dict, ready to be saved as JSON
+
+    """
+    feeds = load_feeds(pairs, dpath)
+
+    results = dict()
+    for name, builder in cases().items():
+        if only and name not in only:
+            continue
+
+        golden_path = os.path.join(golden_dir, name.replace(':', '_') + '.npz')
+        golden = dict(np.load(golden_path)) if os.path.exists(golden_path) else dict()
+        record = dict(parity=True, golden=bool(golden), mismatch=[], vectorized=vectorized(name))
+        fresh = dict()
+        for mode in MODES:
+            bars, seconds, outputs = 0, 0.0, dict()
+            try:
+                for pair, columns in feeds.items():
+                    s, _, lines = run_case(builder, columns, mode)
+                    bars += len(columns['close'])
+                    seconds += s
+                    outputs[pair] = lines
+                record[mode] = dict(error=None, bars=bars, seconds=seconds, bars_per_sec=bars/seconds)
+                if memory:
+                    record[mode]['peak_bytes'] = run_case(builder, next(iter(feeds.values())), mode, memory=True)[1]
+            except Exception as e:
+                record[mode] = dict(error='{}: {}'.format(type(e).__name__, e))
+                continue
+
+            for pair, lines in outputs.items():
+                for label, line in lines.items():
+                    key = '{}/{}'.format(pair, label)
+                    if mode == 'runonce':
+                        fresh[key] = line
+                    # Both modes have to reproduce the golden (or else the runonce) output
+                    ref = golden[key] if key in golden else fresh.get(key)
+                    skip = max(int(golden.get(key + '@skip', 0)), GOLDEN_WARMUP.get(name, 0) if key in golden else 0)
+                    if ref is None or not outputs_match(line[skip:], ref[skip:]):
+                        record['parity'] = False
+                        record['mismatch'].append('{} {}'.format(mode, key))
+
+        if write_golden and not golden and fresh:
+            # Leading Bars that Read Before the First Bar are not Held to the Golden
+            for pair, columns in feeds.items():
+                shorter = run_case(builder, {c: v[:-1] for c, v in columns.items()}, 'runonce')[2]
+                for label, line in shorter.items():
+                    key = '{}/{}'.format(pair, label)
+                    fresh[key + '@skip'] = np.array(wrapped_bars(fresh[key], line))
+            os.makedirs(golden_dir, exist_ok=True)
+            np.savez_compressed(golden_path, **fresh)
+        results[name] = record
+
+    return dict(
+        meta=dict(
+            date=datetime.datetime.now().isoformat(timespec='seconds'),
+            python=platform.python_version(),
+            backtrader=bt.__version__,
+            numpy=np.__version__,
+            pairs=list(feeds.keys()),
+        ),
+        results=results,
+    )
+
+
+def vectorized(name):
+    """
+    Whether the registry declares the indicator of a role case vectorized (None for indicator classes)
+    """
+    for role, ind, params in ROLE_CASES:
+        if name == '{}:{}'.format(role, ind):
+            return REGISTRY[ind].vectorized(params)
+    return None
+
+
+def wrapped_bars(line, shorter):
+    """
+    Number of leading bars of an output that change when the feed loses its last bar. Those
+    bars read before the first bar, where negative indexes wrap around to the end of the
+    array, so their values are not a property of the indicator
+    :param line: Output array on the full feed
+    :param shorter: The same output on the feed without its last bar
+
+    """
+    differ = ~np.isclose(line[:len(shorter)], shorter, rtol=1e-8, atol=1e-10, equal_nan=True)
+    return int(np.nonzero(differ)[0][-1]) + 1 if differ.any() else 0
+
+
+def outputs_match(a, b, rtol=1e-8, atol=1e-10):
+    """
+    True if two output arrays agree (NaN warm-up values included)
+    """
+    return a.shape == b.shape and np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+
+
+def compare(current, baseline, tolerance=0.15):
+    """
+    Flags regressions of a benchmark run against a baseline run
+    :param current: Results of the new run (see benchmark)
+    :param baseline: Results of the stored run
+    :param tolerance: Allowed relative drop in bars per second
+    :return: List of (case, description) tuples
+
+    """
+    regressions = []
+    for name, record in current['results'].items():
+        if not record['parity']:
+            regressions.append((name, 'output mismatch ' + ', '.join(record['mismatch'][:3])))
+
+        base = baseline['results'].get(name)
+        for mode in MODES:
+            if record[mode]['error']:
+                # Only new failures count, known broken modes stay reported in the table
+                if base is None or not base[mode]['error']:
+                    regressions.append((name, '{} error {}'.format(mode, record[mode]['error'])))
+                continue
+            if base is None or base[mode]['error']:
+                continue
+            new, old = record[mode]['bars_per_sec'], base[mode]['bars_per_sec']
+            if new < old * (1.0 - tolerance):
+                regressions.append((name, '{} {:.0f} -> {:.0f} bars/s ({:+.0%})'.format(mode, old, new, new/old - 1.0)))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print('{:<30}{:>14}{:>14}{:>12}{:>12}{:>8}{:>6}'.format('Case', 'Once Bars/s', 'Next Bars/s', 'Peak KB', 'Speedup', 'Parity', 'Vec'))
+    rate = lambda r: 'ERROR' if r['error'] else '{:.0f}'.format(r['bars_per_sec'])
+    for name, record in results['results'].items():
+        once, nxt = record['runonce'], record['runnext']
+        speedup = '-'
+        base = baseline['results'].get(name) if baseline else None
+        if base and not once['error'] and not base['runonce']['error']:
+            speedup = '{:.2f}x'.format(once['bars_per_sec'] / base['runonce']['bars_per_sec'])
+        vec = record.get('vectorized')
+        print('{:<30}{:>14}{:>14}{:>12}{:>12}{:>8}{:>6}'.format(
+            name, rate(once), rate(nxt),
+            '{:.0f}'.format(once['peak_bytes']/1024) if once.get('peak_bytes') else '-', speedup,
+            ('golden' if record['golden'] else 'self') if record['parity'] else 'FAIL',
+            '-' if vec is None else 'yes' if vec else 'no'))
+        for mode in MODES:
+            if record[mode]['error']:
+                print('    {} {}'.format(mode, record[mode]['error']))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Indicator benchmarks and golden output checks')
+    parser.add_argument('--pairs', nargs='*', help='Pairs to run on (default all)')
+    parser.add_argument('--only', nargs='*', help='Case names to run (default all)')
+    parser.add_argument('--out', default='Data/bench/latest.json', help='Where to save the results')
+    parser.add_argument('--baseline', default='Data/bench/baseline.json', help='Stored run to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory measurements')
+    parser.add_argument('--write-golden', action='store_true',
+                        help='Store golden arrays for cases that have none (on GOLDEN_PAIRS unless --pairs is given)')
+    args = parser.parse_args()
+
+    pairs = args.pairs if args.pairs or not args.write_golden else list(GOLDEN_PAIRS)
+    results = benchmark(pairs, only=args.only, memory=not args.no_memory, write_golden=args.write_golden)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=1)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.save_baseline or baseline is None:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print('Saved baseline to ' + args.baseline)
+    else:
+        regressions = compare(results, baseline)
+        for name, text in regressions:
+            print('REGRESSION {}: {}'.format(name, text))
+        print('{} regressions against {}'.format(len(regressions), args.baseline))
@@ -1,5 +1,8 @@
 import backtrader as bt
+import datetime
 import glob
+import csv
+import os
 
 # Custome Forex Commission Scheme
 
@@ -41,7 +44,7 @@ class forexSpreadCommisionScheme(bt.CommInfoBase):
         elif self.p.method == 2:
             # Account Currency Neither Base or Counter - Pip Cost $0.0001/Exchange_Rate
             # Exchange Rate = AccountCurrency/Counter
-            pip_cost = 0.0001/self.p.exchange_rate
+            pip_cost = 0.0001/self.get_exchange_rate()
 
         pip_cost = pip_cost*multiplier
 
@@ -49,6 +52,43 @@ class forexSpreadCommisionScheme(bt.CommInfoBase):
 
         return comm
 
+    def get_exchange_rate(self):
+        return self.p.exchange_rate
+
+
+class forexLiveRateCommisionScheme(forexSpreadCommisionScheme):
+    '''
+    Spread commission for pairs whose counter currency is not the account
+    currency. Instead of a snapshot of the exchange rate it reads the current
+    one off the close lines of the conversion feeds whenever the broker asks,
+    so it is registered once per pair and converts commission and profit/loss
+    at the close of the bar an order fills on.
+
+    *New Params*
+    legs: Tuple of (close line, power) pairs - the closes, each raised to its
+    power of 1 or -1, multiply up to the counter currency bought by one unit
+    of the account currency
+    '''
+    params = (
+        ('legs', ()),
+        )
+
+    def get_exchange_rate(self):
+        rate = 1.0
+        for close, power in self.p.legs:
+            rate = rate*close[0] if power > 0 else rate/close[0]
+        return rate
+
+    def profitandloss(self, size, price, newprice):
+        # Counter Currency Profit Converted at the Current Rate
+        return size * (newprice - price) / self.get_exchange_rate()
+
+    def cashadjust(self, size, price, newprice):
+        if not self._stocklike:
+            return size * (newprice - price) / self.get_exchange_rate()
+
+        return 0.0
+
 def notifier(order,date,sl_list,verbose=True):
     if hasattr(order,'Accepted'):
         # Is an Order Object
@@ -131,6 +171,22 @@ def notifier(order,date,sl_list,verbose=True):
                 print('-' * 80)
 
 
+class TradeList(bt.Analyzer):
+    '''
+    Collects the closed trades of a run as (dtopen, dtclose, long, pnlcomm)
+    '''
+
+    def start(self):
+        self.trades = []
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.trades.append((trade.dtopen, trade.dtclose, trade.long, trade.pnlcomm))
+
+    def get_analysis(self):
+        return self.trades
+
+
 def printTradeAnalysis(analyzer):
     '''
     Function to print the Technical Analysis results in a nice format.
@@ -172,7 +228,69 @@ class CSVData(bt.feeds.GenericCSV):
         ('dtformat','%d.%m.%Y %H:%M:%S.000'),
     )
 
-def file_browser():
-    paths = [f.split('\\')[1] for f in glob.glob('Data/*.csv')]
+def file_browser(dpath='Data/'):
+    paths = [os.path.basename(f) for f in glob.glob(os.path.join(dpath, '*.csv'))]
     names = [f.split('.')[0] for f in paths]
-    return paths, names
\ No newline at end of file
+    return paths, names
+
+def read_csv_columns(path,
+                     dtformat='%d.%m.%Y %H:%M:%S.000',
+                     timeframe=bt.TimeFrame.Days,
+                     sessionend=datetime.time(23, 59, 59, 999990)):
+    '''
+    Parses a Dukascopy CSV ("Gmt time,Open,High,Low,Close,Volume") once into
+    column lists that ArrayData can replay without touching the file again.
+    Datetimes are stored as backtrader float dates and, like GenericCSVData,
+    daily bars are stamped at the end of their session.
+    '''
+    columns = dict(datetime=[], open=[], high=[], low=[], close=[], volume=[])
+    with open(path, 'r') as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if not row:
+                continue
+            dt = datetime.datetime.strptime(row[0], dtformat)
+            dtnum = bt.date2num(dt)
+            if timeframe >= bt.TimeFrame.Days:
+                dtnum = max(dtnum, bt.date2num(datetime.datetime.combine(dt.date(), sessionend)))
+            columns['datetime'].append(dtnum)
+            columns['open'].append(float(row[1]))
+            columns['high'].append(float(row[2]))
+            columns['low'].append(float(row[3]))
+            columns['close'].append(float(row[4]))
+            columns['volume'].append(float(row[5]))
+    return columns
+
+class ArrayData(bt.feed.DataBase):
+    '''
+    Data feed that replays pre-parsed columns (see read_csv_columns) instead
+    of parsing a file. Pass the columns dict as dataname.
+    '''
+
+    def start(self):
+        super(ArrayData, self).start()
+        self._cols = self._columns()
+        self._idx = 0
+        self._size = len(self._cols['datetime'])
+
+    def _columns(self):
+        return self.p.dataname
+
+    def _load(self):
+        i = self._idx
+        if i >= self._size:
+            return False
+
+        # Plain floats: bounded (exactbars) buffers keep values as they are given
+        cols = self._cols
+        self.lines.datetime[0] = float(cols['datetime'][i])
+        self.lines.open[0] = float(cols['open'][i])
+        self.lines.high[0] = float(cols['high'][i])
+        self.lines.low[0] = float(cols['low'][i])
+        self.lines.close[0] = float(cols['close'][i])
+        self.lines.volume[0] = float(cols['volume'][i])
+        self.lines.openinterest[0] = float('NaN')
+
+        self._idx += 1
+        return True
\ No newline at end of file
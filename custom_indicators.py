@@ -1,8 +1,154 @@
 import backtrader as bt
 import backtrader.indicators as bitind
 import numpy as np
-from scipy import stats
+from numpy.lib.stride_tricks import sliding_window_view
 import math
+import bisect
+import collections
+
+# Array Helpers for runonce (once) Calculations
+
+def as_array(line):
+    # Zero-copy numpy view over a line buffer (writes go straight to the line)
+    return np.frombuffer(line.array, dtype=np.float64)
+
+def lagged(line, ago):
+    # line[-ago], held at the first bar while fewer bars exist, so warm-up code
+    # never wraps around a preloaded buffer or runs off a bounded (exactbars) one
+    return line[-min(ago, len(line) - 1)]
+
+def iir_filter(b, a, x, y, start, end):
+    '''
+    Runs the recursive filter a*y = b*x over [start, end) in one pass.
+    Filter state is seeded from the values already sitting in x and y
+    before start (e.g. those written by prenext/preonce).
+    '''
+    # SciPy is imported on first use - it is slow to load and only the IIR filters need it
+    from scipy import signal
+    nb, na = len(b) - 1, len(a) - 1
+    zi = signal.lfiltic(b, a, y[start-na:start][::-1], x[start-nb:start][::-1])
+    out, _ = signal.lfilter(b, a, x[start:end], zi=zi)
+    return out
+
+def rolling_max(x, period, start, end):
+    # max(x[i-period+1:i+1]) for every i in [start, end)
+    return sliding_window_view(x[start-period+1:end], period).max(axis=1)
+
+def rolling_min(x, period, start, end):
+    # min(x[i-period+1:i+1]) for every i in [start, end)
+    return sliding_window_view(x[start-period+1:end], period).min(axis=1)
+
+def rolling_linreg(y, period, start, end):
+    # Least-squares fit of y[i-period+1:i+1] evaluated at i, for every i in [start, end)
+    n = float(period)
+    windows = sliding_window_view(y[start-period+1:end], period)
+    sy = windows.sum(axis=1)
+    sxy = windows @ np.arange(period, dtype=np.float64)
+    slope = (n*sxy - n*(n-1)/2*sy)/(n*n*(n*n-1)/12)
+    return sy/n + slope*(n-1)/2
+
+def fill_forward(values, mask, prev):
+    # values where mask holds, else the last value that did (prev before the first)
+    idx = np.where(mask, np.arange(len(values)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    return np.where(idx >= 0, values[np.maximum(idx, 0)], prev)
+
+class RollingExtrema(object):
+    '''
+    Minimum and maximum of the last period values pushed, with amortized
+    O(1) updates. Each side is a deque of (index, value) that only keeps the
+    values which can still become the extreme of a later window.
+    '''
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.lows = collections.deque()
+        self.highs = collections.deque()
+
+    def push(self, x):
+        """
+        Slides the window over a new value
+        :return: (min, max) of the window
+        """
+        i = self.count
+        self.count += 1
+        lows, highs = self.lows, self.highs
+        while lows and lows[-1][1] >= x:
+            lows.pop()
+        lows.append((i, x))
+        while highs and highs[-1][1] <= x:
+            highs.pop()
+        highs.append((i, x))
+        # Only the value pushed period steps ago can have left the window
+        if lows[0][0] <= i - self.period:
+            lows.popleft()
+        if highs[0][0] <= i - self.period:
+            highs.popleft()
+        return lows[0][1], highs[0][1]
+
+class RollingLinReg(object):
+    '''
+    Least-squares line through the last period values pushed (x = 0 for the
+    oldest, period-1 for the newest), evaluated at the newest value. Keeps
+    running sums of y and x*y so every update is O(1).
+    '''
+
+    def __init__(self, period):
+        self.period = period
+        self.values = collections.deque()
+        self.sy = 0.0
+        self.sxy = 0.0
+        # Sums over x only depend on the period
+        n = float(period)
+        self.sx = n*(n-1)/2
+        self.den = n*n*(n*n-1)/12    # n*sum(x*x) - sum(x)**2
+
+    def push(self, y):
+        """
+        Slides the window over a new value
+        :return: Fitted value at the newest point (nan until the window is full)
+        """
+        values, n = self.values, self.period
+        if len(values) == n:
+            # Shifting the window moves every remaining x down by one
+            old = values.popleft()
+            self.sy -= old
+            self.sxy -= self.sy
+        self.sxy += len(values)*y
+        self.sy += y
+        values.append(y)
+        if len(values) < n:
+            return float('nan')
+        slope = (n*self.sxy - self.sx*self.sy)/self.den
+        return self.sy/n + slope*(n-1)/2
+
+class RollingHighLow(bt.Indicator):
+    '''
+    Highest and lowest value of the input over the last period bars, in one
+    pass over the data (same values as bt.ind.Highest and bt.ind.Lowest).
+    '''
+
+    lines = ('high', 'low')
+
+    params = (('period', 20),)
+
+    plotinfo = dict(subplot=False)
+
+    def __init__(self):
+        self.addminperiod(self.p.period)
+        self.window = RollingExtrema(self.p.period)
+
+    def prenext(self):
+        self.window.push(self.data[0])
+
+    def next(self):
+        self.l.low[0], self.l.high[0] = self.window.push(self.data[0])
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        as_array(self.l.high)[start:end] = rolling_max(x, self.p.period, start, end)
+        as_array(self.l.low)[start:end] = rolling_min(x, self.p.period, start, end)
 
 class iFisher(bt.Indicator):
 
@@ -22,8 +168,8 @@ class iFisher(bt.Indicator):
 
         self.addminperiod(self.p.period)
 
-        hi = bt.indicators.Highest(self.data, period=self.p.period)
-        lo = bt.indicators.Lowest(self.data, period=self.p.period)
+        hl = RollingHighLow(self.data, period=self.p.period)
+        hi, lo = hl.high, hl.low
 
         # Calculate Rescaling
 
@@ -32,7 +178,7 @@ class iFisher(bt.Indicator):
 
     def next(self):
 
-        self.lines.ifisher[0] = (np.exp(2*self.l.smoothed[0])-1)/(np.exp(2*self.l.smoothed[0])+1)
+        self.lines.ifisher[0] = (math.exp(2*self.l.smoothed[0])-1)/(math.exp(2*self.l.smoothed[0])+1)
 
 class iTrend(bt.indicators.PeriodN):
 
@@ -47,11 +193,15 @@ class iTrend(bt.indicators.PeriodN):
         plotlinelabels=True)
 
     def __init__(self):
-        self.alpha = 2.0/(1+self.p.period)
+        self.alpha = a = 2.0/(1+self.p.period)
         self.addminperiod(self.p.period)
 
+        # Filter Coefficients for once()
+        self.num = [a - (a/2)**2, a**2/2, -(a - 3*a**2/4)]
+        self.den = [1.0, -2*(1-a), (1-a)**2]
+
     def prenext(self):
-        self.l.itrend[0] = (self.data[0] + 2*self.data[-1] + self.data[-2])/4
+        self.l.itrend[0] = (self.data[0] + 2*lagged(self.data, 1) + lagged(self.data, 2))/4
 
     def next(self):
 
@@ -67,6 +217,18 @@ class iTrend(bt.indicators.PeriodN):
 
         self.lines.trigger[0] = 2*self.l.itrend[0] - self.l.itrend[-2]
 
+    def preonce(self, start, end):
+        x = as_array(self.data)
+        it = as_array(self.l.itrend)
+        for i in range(start, end):
+            it[i] = (x[i] + 2*x[max(i-1, 0)] + x[max(i-2, 0)])/4
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        it = as_array(self.l.itrend)
+        it[start:end] = iir_filter(self.num, self.den, x, it, start, end)
+        as_array(self.l.trigger)[start:end] = 2*it[start:end] - it[start-2:end-2]
+
 class CyberCycle(bt.indicators.PeriodN):
 
     lines = ('cycle',
@@ -88,13 +250,18 @@ class CyberCycle(bt.indicators.PeriodN):
     def __init__(self):
 
         self.addminperiod(self.p.period)
-        self.alpha = 2.0/(1.0 + self.p.period)
+        self.alpha = a = 2.0/(1.0 + self.p.period)
+
+        # Filter Coefficients for once()
+        k = (1 - 0.5*a)**2
+        self.num = [k, -2*k, k]
+        self.den = [1.0, -2*(1-a), (1-a)**2]
 
     def prenext(self):
 
-        self.l.cycle[0] = (self.data[0] - 2*self.data[-1] + self.data[-2])/4
-        self.l.smooth[0] = (self.data[0] + 2*self.data[-1] \
-                            + 2*self.data[-2] + self.data[-3])/6
+        self.l.cycle[0] = (self.data[0] - 2*lagged(self.data, 1) + lagged(self.data, 2))/4
+        self.l.smooth[0] = (self.data[0] + 2*lagged(self.data, 1) \
+                            + 2*lagged(self.data, 2) + lagged(self.data, 3))/6
 
     def next(self):
         a = self.alpha
@@ -105,6 +272,22 @@ class CyberCycle(bt.indicators.PeriodN):
             + 2*(1-a)*self.l.cycle[-1] - ((1-a)**2)*self.l.cycle[-2]
         self.l.trigger[0] = self.l.cycle[-1]
 
+    def preonce(self, start, end):
+        x = as_array(self.data)
+        cycle = as_array(self.l.cycle)
+        smooth = as_array(self.l.smooth)
+        for i in range(start, end):
+            cycle[i] = (x[i] - 2*x[max(i-1, 0)] + x[max(i-2, 0)])/4
+            smooth[i] = (x[i] + 2*x[max(i-1, 0)] + 2*x[max(i-2, 0)] + x[max(i-3, 0)])/6
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        cycle = as_array(self.l.cycle)
+        smooth = as_array(self.l.smooth)
+        smooth[start:end] = (x[start:end] + 2*x[start-1:end-1] + 2*x[start-2:end-2] + x[start-3:end-3])/6
+        cycle[start:end] = iir_filter(self.num, self.den, smooth, cycle, start, end)
+        as_array(self.l.trigger)[start:end] = cycle[start-1:end-1]
+
 class AdaptiveCyberCycle(bt.indicators.PeriodN):
 
     lines = ('cycle',
@@ -129,14 +312,21 @@ class AdaptiveCyberCycle(bt.indicators.PeriodN):
     def __init__(self):
 
         self.addminperiod(self.p.period)
-        self.alpha = 2.0/(1.0 + self.p.period)
-        self.alpha2 = 1.0/(self.p.lag + 1)
+        self.alpha = a = 2.0/(1.0 + self.p.period)
+        self.alpha2 = a2 = 1.0/(self.p.lag + 1)
+
+        # Filter Coefficients for once()
+        k = (1 - 0.5*a)**2
+        self.num = [k, -2*k, k]
+        self.den = [1.0, -2*(1-a), (1-a)**2]
+        self.signal_num = [a2]
+        self.signal_den = [1.0, -(1 - a2)]
 
     def prenext(self):
 
-        self.l.cycle[0] = (self.data[0] - 2*self.data[-1] + self.data[-2])/4
-        self.l.smooth[0] = (self.data[0] + 2*self.data[-1] \
-                            + 2*self.data[-2] + self.data[-3])/6
+        self.l.cycle[0] = (self.data[0] - 2*lagged(self.data, 1) + lagged(self.data, 2))/4
+        self.l.smooth[0] = (self.data[0] + 2*lagged(self.data, 1) \
+                            + 2*lagged(self.data, 2) + lagged(self.data, 3))/6
         self.l.signal[0] = self.alpha2*self.l.cycle[0]
 
     def next(self):
@@ -151,6 +341,26 @@ class AdaptiveCyberCycle(bt.indicators.PeriodN):
         self.l.signal[0] = a2*self.l.cycle[0] + (1 - a2)*self.l.signal[-1]
         self.l.trigger[0] = self.l.signal[-1]
 
+    def preonce(self, start, end):
+        x = as_array(self.data)
+        cycle = as_array(self.l.cycle)
+        smooth = as_array(self.l.smooth)
+        sig = as_array(self.l.signal)
+        for i in range(start, end):
+            cycle[i] = (x[i] - 2*x[max(i-1, 0)] + x[max(i-2, 0)])/4
+            smooth[i] = (x[i] + 2*x[max(i-1, 0)] + 2*x[max(i-2, 0)] + x[max(i-3, 0)])/6
+            sig[i] = self.alpha2*cycle[i]
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        cycle = as_array(self.l.cycle)
+        smooth = as_array(self.l.smooth)
+        sig = as_array(self.l.signal)
+        smooth[start:end] = (x[start:end] + 2*x[start-1:end-1] + 2*x[start-2:end-2] + x[start-3:end-3])/6
+        cycle[start:end] = iir_filter(self.num, self.den, smooth, cycle, start, end)
+        sig[start:end] = iir_filter(self.signal_num, self.signal_den, cycle, sig, start, end)
+        as_array(self.l.trigger)[start:end] = sig[start-1:end-1]
+
 class HeikenAshi(bt.Indicator):
 
     lines=('open','high','low','close','signal')
@@ -167,7 +377,7 @@ class HeikenAshi(bt.Indicator):
 
 
     def __init__(self):
-        self.addminperiod=2
+        self.addminperiod(2)
 
     def next(self):
         self.l.open[0] = o = (self.data.open[-1] + self.data.close[-1])/2.0
@@ -291,17 +501,39 @@ class TrendTriggerFactor(bt.Indicator):
     def __init__(self):
         self.addminperiod(2*self.p.period+1)
 
+        # Rolling Extremes of High/Low and Their Recent History (for the lagged window)
+        self.highs = RollingExtrema(self.p.period)
+        self.lows = RollingExtrema(self.p.period)
+        self.history = collections.deque(maxlen=self.p.period+2)
+
+    def push(self, high, low):
+        self.history.append((self.highs.push(high)[1], self.lows.push(low)[0]))
+
+    def nextstart(self):
+        # Windows of the bars before this one
+        for i in range(2*self.p.period, 0, -1):
+            self.push(self.data.high[-i], self.data.low[-i])
+        self.next()
+
     def next(self):
-        p = self.p.period+1
-        Hi = self.data.high.get(ago=0,size=self.p.period)
-        Lo = self.data.low.get(ago=0,size=self.p.period)
-        lagHi = self.data.high.get(ago=-p,size=self.p.period)
-        lagLo = self.data.low.get(ago=-p,size=self.p.period)
+        self.push(self.data.high[0], self.data.low[0])
+        Hi, Lo = self.history[-1]
+        lagHi, lagLo = self.history[0]
 
-        bp = max(Hi) - min(lagLo)
-        sp = max(lagHi) - min(Lo)
+        bp = Hi - lagLo
+        sp = lagHi - Lo
         self.l.ttf[0] = 100*(bp-sp)/(0.5*(bp+sp))
 
+    def once(self, start, end):
+        p = self.p.period+1
+        Hi = rolling_max(as_array(self.data.high), self.p.period, start-p, end)
+        Lo = rolling_min(as_array(self.data.low), self.p.period, start-p, end)
+
+        bp = Hi[p:] - Lo[:-p]
+        sp = Hi[:-p] - Lo[p:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            as_array(self.l.ttf)[start:end] = 100*(bp-sp)/(0.5*(bp+sp))
+
 class TrendDirectionForceIndex(bt.Indicator):
 
     lines=('mma','smma','tdf','ntdf')
@@ -326,26 +558,40 @@ class TrendDirectionForceIndex(bt.Indicator):
         self.addminperiod(self.p.period*3)
         self.l.mma = bt.indicators.EMA(self.data.close*1000,period=self.p.period)
         self.l.smma = bt.indicators.EMA(self.l.mma,period=self.p.period)
+        self.window = RollingExtrema(self.p.period*3)
 
-    def prenext(self):
-
+    def update_tdf(self):
+        # Sets tdf and returns the largest |tdf| of the last period*3 bars
         impetmma = self.l.mma[0] - self.l.mma[-1]
         impetsmma = self.l.smma[0] - self.l.smma[-1]
         divma = abs(self.l.mma[0] - self.l.smma[0])
         averimpet = (impetmma+impetsmma)/2
         pow = averimpet**3
         self.l.tdf[0] = divma * pow
+        return self.window.push(abs(self.l.tdf[0]))[1]
+
+    def prenext(self):
+
+        self.update_tdf()
 
     def next(self):
 
-        impetmma = self.l.mma[0] - self.l.mma[-1]
-        impetsmma = self.l.smma[0] - self.l.smma[-1]
-        divma = abs(self.l.mma[0] - self.l.smma[0])
-        averimpet = (impetmma+impetsmma)/2
-        pow = averimpet**3
+        top = self.update_tdf()
+        self.l.ntdf[0] = self.l.tdf[0]/top
 
-        self.l.tdf[0] = divma * pow
-        self.l.ntdf[0] = self.l.tdf[0]/(max(np.absolute(self.l.tdf.get(size=self.p.period*3))))
+    def preonce(self, start, end):
+        mma = as_array(self.l.mma)
+        smma = as_array(self.l.smma)
+        # Previous bar (index -1 wraps around like the line buffers do)
+        prev = np.arange(start, end) - 1
+        averimpet = ((mma[start:end] - mma[prev]) + (smma[start:end] - smma[prev]))/2
+        as_array(self.l.tdf)[start:end] = np.abs(mma[start:end] - smma[start:end]) * averimpet**3
+
+    def once(self, start, end):
+        self.preonce(start, end)
+        tdf = as_array(self.l.tdf)
+        top = rolling_max(np.abs(tdf[:end]), self.p.period*3, start, end)
+        as_array(self.l.ntdf)[start:end] = tdf[start:end]/top
 
 class WaddahAttarExplosion(bt.Indicator):
     lines = ('macd', 'utrend', 'dtrend', 'exp', 'dead')
@@ -472,18 +718,34 @@ class SuperSmoothFilter(bt.Indicator):
     def __init__(self):
         self.addminperiod(10)
 
+        a1 = math.exp(-1.414*3.14159/self.p.period)
+        b1 = 2*a1*math.cos(math.radians(1.414*180/self.p.period))
+        self.c2 = b1
+        self.c3 = -a1*a1
+        self.c1 = 1 - self.c2 - self.c3
+
+        # Filter Coefficients for once()
+        self.num = [self.c1/2, self.c1/2]
+        self.den = [1.0, -self.c2, -self.c3]
+
     def prenext(self):
 
-        self.l.filter[0] = (self.data[0]+self.data[-1])/2
+        self.l.filter[0] = (self.data[0]+lagged(self.data, 1))/2
 
     def next(self):
 
-        a1 = np.exp(-1.414*3.14159/self.p.period)
-        b1 = 2*a1*np.cos(np.deg2rad(1.414*180/self.p.period))
-        c2 = b1
-        c3 = -a1*a1
-        c1 = 1 - c2 - c3
-        self.l.filter[0] = c1*(self.data[0]+self.data[-1])/2 + c2*self.l.filter[-1] + c3*self.l.filter[-2]
+        self.l.filter[0] = self.c1*(self.data[0]+self.data[-1])/2 + self.c2*self.l.filter[-1] + self.c3*self.l.filter[-2]
+
+    def preonce(self, start, end):
+        x = as_array(self.data)
+        filt = as_array(self.l.filter)
+        for i in range(start, end):
+            filt[i] = (x[i]+x[max(i-1, 0)])/2
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        filt = as_array(self.l.filter)
+        filt[start:end] = iir_filter(self.num, self.den, x, filt, start, end)
 
 class ElhersHighPass(bt.Indicator):
 
@@ -502,24 +764,43 @@ class ElhersHighPass(bt.Indicator):
     def __init__(self):
         self.addminperiod(10)
 
+        self.a1 = a1 = (math.cos(self.deg(.707*360/self.p.period)) + math.sin(self.deg(.707*360/self.p.period))-1)/math.cos(self.deg(.707*360/self.p.period))
+
+        # Filter Coefficients for once()
+        k = (1 - a1/2)**2
+        self.num = [k, -2*k, k]
+        self.den = [1.0, -2*(1-a1), (1-a1)**2]
+
     def deg(self,arg):
 
-        return np.deg2rad(arg)
+        return math.radians(arg)
 
     def prenext(self):
         c = self.data[0]
-        c1 = self.data[-1]
-        c2 = self.data[-2]
-        a1 = (np.cos(self.deg(.707*360/self.p.period)) + np.sin(self.deg(.707*360/self.p.period))-1)/np.cos(self.deg(.707*360/self.p.period))
+        c1 = lagged(self.data, 1)
+        c2 = lagged(self.data, 2)
+        a1 = self.a1
         self.l.hp[0] = ((1 - a1/2)**2)*(c - 2*c1 + c2)
 
     def next(self):
         c = self.data.close[0]
         c1 = self.data.close[-1]
         c2 = self.data.close[-2]
-        a1 = (np.cos(self.deg(.707*360/self.p.period)) + np.sin(self.deg(.707*360/self.p.period))-1)/np.cos(self.deg(.707*360/self.p.period))
+        a1 = self.a1
         self.l.hp[0] = ((1 - a1/2)**2)*(c - 2*c1 + c2) + 2*(1-a1)*self.l.hp[-1] - ((1-a1)**2)*self.l.hp[-2]
 
+    def preonce(self, start, end):
+        x = as_array(self.data)
+        hp = as_array(self.l.hp)
+        k = self.num[0]
+        for i in range(start, end):
+            hp[i] = k*(x[i] - 2*x[max(i-1, 0)] + x[max(i-2, 0)])
+
+    def once(self, start, end):
+        x = as_array(self.data)
+        hp = as_array(self.l.hp)
+        hp[start:end] = iir_filter(self.num, self.den, x, hp, start, end)
+
 class RoofingFilter(bt.Indicator):
 
     lines = ('roof','iroof')
@@ -545,124 +826,73 @@ class RoofingFilter(bt.Indicator):
 
 class MAMA(bt.Indicator):
 
-    lines = ('p', 'S', 'D', 'mp', 'Q1', 'I1', 'Q2', 'I2', 'jI', 'jQ', 'Re', 'Im', 'phi', 'smoothPeriod',
-             'MAMA','FAMA')
+    lines = ('MAMA','FAMA')
 
     params = (
         ('fast', 20),
         ('slow', 50),
     )
 
-    plotlines = dict(p=dict(_plotskip=True, ),
-                     S=dict(_plotskip=True, ),
-                     D=dict(_plotskip=True, ),
-                     mp=dict(_plotskip=True, ),
-                     Q1=dict(_plotskip=True, ),
-                     I1=dict(_plotskip=True, ),
-                     Q2=dict(_plotskip=True, ),
-                     I2=dict(_plotskip=True, ),
-                     jI=dict(_plotskip=True, ),
-                     jQ=dict(_plotskip=True, ),
-                     Re=dict(_plotskip=True, ),
-                     Im=dict(_plotskip=True, ),
-                     phi=dict(_plotskip=True, ),
-                     smoothPeriod=dict(_plotskip=True, )
-                     )
-
     plotinfo = dict(
         plot=True,
         plotname='Mesa Adaptive Moving Average',
         subplot=False,
         plotlinelabels=True)
 
-    def hilbertTransform(self,data):
-
+    # Only MAMA and FAMA are kept as lines. The Hilbert transform works on the
+    # last 7 values of its input, so the smoothed price and the detrender live
+    # in small ring buffers and the phase is a single float.
+    #
+    # next resets the measured period to 0 before the transforms run, so they
+    # always use the base gain of 0.54 (prenext, with a period of 1, uses 0.615)
+    # and the homodyne period measurement never reaches MAMA/FAMA. It is not
+    # computed.
+
+    def hilbertTransform(self, x0, x2, x4, x6, period):
+        # Works on floats and on numpy arrays of the lagged values alike
         a, b, c, d = [0.0962, 0.5769, 0.075, 0.54]
-        d0 = data[0]
-        d2 = data[-2]
-        d4 = data[-4]
-        d6 = data[-6]
-        hilbert = a*d0 + b*d2 - b*d4 - a*d6
-        return hilbert*(c*self.l.mp[0] + d)
-
-    def smoother(self,data):
-
-        return 0.2*data[0] + 0.8*data[-1]
-
-    def deg(self,arg):
-        return np.rad2deg(arg)
+        hilbert = a*x0 + b*x2 - b*x4 - a*x6
+        return hilbert*(c*period + d)
 
     def __init__(self):
         self.fast = 2/(self.p.fast+1)
         self.slow = 2/(self.p.slow+1)
         self.addminperiod(40)
-        self.l.p = (self.data.high + self.data.low)/2
+
+        # Ring Buffers (Newest Value Last) and Phase of the Previous Bar
+        self.prices = collections.deque([0.0]*4, maxlen=4)
+        self.smooth = collections.deque([0.0]*7, maxlen=7)
+        self.detrend = collections.deque([0.0]*7, maxlen=7)
+        self.phase = 0.0
+
+    def update_detrend(self, period):
+        # Smooth and Detrend the Median Price
+        p = self.prices
+        p.append((self.data.high[0] + self.data.low[0])/2)
+        S = self.smooth
+        S.append((4*p[-1] + 3*p[-2] + 2*p[-3] + 3*p[-4])/10)
+        self.detrend.append(self.hilbertTransform(S[-1], S[-3], S[-5], S[-7], period))
+        return p[-1]
 
     def prenext(self):
         # Variable Initialization
-        self.l.Q1[0] = 0.0
-        self.l.Q2[0] = 0.0
-        self.l.I1[0] = 0.0
-        self.l.I2[0] = 0.0
-        self.l.jQ[0] = 0.0
-        self.l.jI[0] = 0.0
-        self.l.Im[0] = 0.0
-        self.l.Re[0] = 0.0
-        self.l.phi[0] = 0.0
-        self.l.smoothPeriod[0] = 0.0
-        self.l.mp[0] = 1.0
+        self.update_detrend(1.0)
         self.l.MAMA[0] = 0.0
         self.l.FAMA[0] = 0.0
-        self.l.S[0] = (4 * self.l.p[0] + 3 * self.l.p[-1] + 2 * self.l.p[-2] + 3 * self.l.p[-3])/10
-        self.l.D[0] = self.hilbertTransform(self.l.S)
 
     def next(self):
-        self.l.mp[0] = 0.0
-
-        self.l.S[0] = (4*self.l.p[0] + 3*self.l.p[-1] + 2*self.l.p[-2]+ 3*self.l.p[-3])/10
-
-        # Smooth and Detrend
-        self.l.D[0] = self.hilbertTransform(self.l.S)
+        price = self.update_detrend(0.0)
 
         # Inphase and Quadrature
-        self.l.Q1[0] = self.hilbertTransform(self.l.D)
-        self.l.I1[0] = self.l.D[-3]
-
-        # Phase Advancement of Inphase and Quadrature by 90 degrees
-        self.l.jI[0] = self.hilbertTransform(self.l.I1)
-        self.l.jQ[0] = self.hilbertTransform(self.l.Q1)
-
-        # Phasor Addition - 3 Bar Averaging
-        self.l.I2[0] = self.l.I1[0] - self.l.jQ[0]
-        self.l.Q2[0] = self.l.Q1[0] - self.l.jI[0]
-
-        # Smoothing of I and Q
-        self.l.I2[0] = self.smoother(self.l.I2)
-        self.l.Q2[0] = self.smoother(self.l.Q2)
-
-        # Hemodyne Discriminator
-        self.l.Re[0] = self.l.I2[0]*self.l.I2[-1] + self.l.Q2[0]*self.l.Q2[-1]
-        self.l.Im[0] = self.l.I2[0]*self.l.Q2[-1] + self.l.Q2[0]*self.l.I2[-1]
-
-        self.l.Re[0] = self.smoother(self.l.Re)
-        self.l.Im[0] = self.smoother(self.l.Im)
-
-        if self.l.Im[0] != 0.0 and self.l.Re[0] != 0.0:
-            self.l.mp[0] = 360/(self.deg(np.arctan(self.l.Im[0]/self.l.Re[0])))
-        if self.l.mp[0] > 1.5*self.l.mp[-1]:
-            self.l.mp[0] = 1.5*self.l.mp[-1]
-        if self.l.mp[0] < (2.0/3)*self.l.mp[-1]:
-            self.l.mp[0] = (2.0/3)*self.l.mp[-1]
-        if self.l.mp[0] < 6:
-            self.l.mp[0] = 6.0
-        if self.l.mp[0] > 50:
-            self.l.mp[0] = 50.0
-        self.l.mp[0] = self.smoother(self.l.mp)
-        self.l.smoothPeriod[0] = (1.0/3)*self.l.mp[0] + (2.0/3)*self.l.smoothPeriod[-1]
-
-        if self.l.I1[0] != 0.0:
-            self.l.phi[0] = self.deg(np.arctan(self.l.Q1[0]/self.l.I1[0]))
-        dphi = self.l.phi[-1] - self.l.phi[0]
+        D = self.detrend
+        Q1 = self.hilbertTransform(D[-1], D[-3], D[-5], D[-7], 0.0)
+        I1 = D[-4]
+
+        # Phase Rate of Change
+        dphi = self.phase
+        if I1 != 0.0:
+            self.phase = math.degrees(math.atan(Q1/I1))
+        dphi -= self.phase
 
         if dphi < 1:
             dphi = 1.0
@@ -674,9 +904,48 @@ class MAMA(bt.Indicator):
         if alpha > self.fast:
             alpha = self.fast
 
-        self.l.MAMA[0] = alpha*self.l.p[0] + (1-alpha)*self.l.MAMA[-1]
+        self.l.MAMA[0] = alpha*price + (1-alpha)*self.l.MAMA[-1]
         self.l.FAMA[0] = 0.5*alpha*self.l.MAMA[0] + (1-0.5*alpha)*self.l.FAMA[-1]
 
+    def preonce(self, start, end):
+        as_array(self.l.MAMA)[start:end] = 0.0
+        as_array(self.l.FAMA)[start:end] = 0.0
+
+    def once(self, start, end):
+        # Price, smoothing, detrender and phase are array operations over
+        # [start, end) plus the 15 bars they look back on. Only the MAMA/FAMA
+        # recursion runs bar by bar.
+        lo = start - 15
+        p = (as_array(self.data.high)[lo:end] + as_array(self.data.low)[lo:end])/2
+        S = (4*p[3:] + 3*p[2:-1] + 2*p[1:-2] + 3*p[:-3])/10
+
+        # Bars before the first next bar were detrended by prenext
+        period = np.where(np.arange(start-6, end) < self._minperiod-1, 1.0, 0.0)
+        D = self.hilbertTransform(S[6:], S[4:-2], S[2:-4], S[:-6], period)
+
+        Q1 = self.hilbertTransform(D[6:], D[4:-2], D[2:-4], D[:-6], 0.0)
+        I1 = D[3:-3]
+        measured = I1 != 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            phase = np.rad2deg(np.arctan(Q1/I1))
+        phase = fill_forward(phase, measured, self.phase)
+
+        dphi = np.concatenate(([self.phase], phase[:-1])) - phase
+        dphi = np.where(dphi < 1, 1.0, dphi)
+        alpha = np.minimum(np.maximum(self.p.fast/dphi, self.slow), self.fast)
+        self.phase = float(phase[-1])
+
+        M, F = as_array(self.l.MAMA), as_array(self.l.FAMA)
+        mama, fama = float(M[start-1]), float(F[start-1])
+        mamas, famas = [], []
+        for a, price in zip(alpha.tolist(), p[15:].tolist()):
+            mama = a*price + (1-a)*mama
+            fama = 0.5*a*mama + (1-0.5*a)*fama
+            mamas.append(mama)
+            famas.append(fama)
+        M[start:end] = mamas
+        F[start:end] = famas
+
 class DecyclerOscillator(bt.Indicator):
 
     lines = ('osc','decycle', 'hp')
@@ -702,15 +971,24 @@ class DecyclerOscillator(bt.Indicator):
 
     def __init__(self):
         self.addminperiod(20)
-        self.b = np.deg2rad(0.707*360/self.p.hp_period)
-        self.a1 = (np.cos(self.b)+np.sin(self.b)-1)/np.cos(self.b)
-        self.a2 = (np.cos(self.b/2)+np.sin(self.b/2)-1)/np.cos(self.b)
+        self.b = math.radians(0.707*360/self.p.hp_period)
+        self.a1 = (math.cos(self.b)+math.sin(self.b)-1)/math.cos(self.b)
+        self.a2 = (math.cos(self.b/2)+math.sin(self.b/2)-1)/math.cos(self.b)
+
+        # Filter Coefficients for once()
+        self.hp_num, self.hp_den = self.coefficients(self.a1)
+        self.osc_num, self.osc_den = self.coefficients(self.a2)
+
+    def coefficients(self,a):
+
+        k = (1-a)**2
+        return [k, -2*k, k], [1.0, -2*(1-a), k]
 
     def prenext(self):
 
         self.l.hp[0] = 0.0
         self.l.osc[0] = 0.0
-        self.l.decycle[0] = self.data.close[-1]
+        self.l.decycle[0] = lagged(self.data.close, 1)
 
     def next(self):
 
@@ -719,6 +997,25 @@ class DecyclerOscillator(bt.Indicator):
 
         self.l.osc[0] = self.filter(self.a2, self.l.decycle, self.l.osc)
 
+    def preonce(self, start, end):
+        close = as_array(self.data.close)
+        hp = as_array(self.l.hp)
+        osc = as_array(self.l.osc)
+        decycle = as_array(self.l.decycle)
+        for i in range(start, end):
+            hp[i] = 0.0
+            osc[i] = 0.0
+            decycle[i] = close[max(i-1, 0)]
+
+    def once(self, start, end):
+        close = as_array(self.data.close)
+        hp = as_array(self.l.hp)
+        osc = as_array(self.l.osc)
+        decycle = as_array(self.l.decycle)
+        hp[start:end] = iir_filter(self.hp_num, self.hp_den, close, hp, start, end)
+        decycle[start:end] = close[start:end] - hp[start:end]
+        osc[start:end] = iir_filter(self.osc_num, self.osc_den, decycle, osc, start, end)
+
 class iDecycler(bt.Indicator):
 
     lines = ('idosc',)
@@ -766,15 +1063,15 @@ class Butterworth(bt.Indicator):
         self.addminperiod(10)
 
         if self.p.poles == 2:
-            self.a1 = np.exp(-1.414*3.14159/self.p.period)
-            self.b1 = 2*self.a1*np.cos(np.deg2rad(1.414*180/self.p.period))
+            self.a1 = math.exp(-1.414*3.14159/self.p.period)
+            self.b1 = 2*self.a1*math.cos(math.radians(1.414*180/self.p.period))
             self.c2 = self.b1
             self.c3 = -self.a1**2
             self.c1 = (1-self.b1+self.a1**2)/4
 
         elif self.p.poles == 3:
-            self.a1 = np.exp(-3.14159 / self.p.period)
-            self.b1 = 2 * self.a1 * np.cos(np.deg2rad(1.738 * 180 / self.p.period))
+            self.a1 = math.exp(-3.14159 / self.p.period)
+            self.b1 = 2 * self.a1 * math.cos(math.radians(1.738 * 180 / self.p.period))
             self.c1 = self.a1 ** 2
             self.c2 = self.b1 + self.c1
             self.c3 = -(self.c1 + self.b1 * self.c1)
@@ -784,6 +1081,14 @@ class Butterworth(bt.Indicator):
         else:
             raise ValueError()
 
+        # Filter Coefficients for once()
+        if self.p.poles == 2:
+            self.num = [self.c1, 2*self.c1, self.c1]
+            self.den = [1.0, -self.c2, -self.c3]
+        elif self.p.poles == 3:
+            self.num = [self.c1, 3*self.c1, 3*self.c1, self.c1]
+            self.den = [1.0, -self.c2, -self.c3, -self.c4]
+
         self.l.p = (self.data.high + self.data.low)/2
 
     def prenext(self):
@@ -802,6 +1107,14 @@ class Butterworth(bt.Indicator):
                                 self.c3 * self.l.butter[-2] + \
                                 self.c4 * self.l.butter[-3]
 
+    def preonce(self, start, end):
+        as_array(self.l.butter)[start:end] = as_array(self.l.p)[start:end]
+
+    def once(self, start, end):
+        p = as_array(self.l.p)
+        butter = as_array(self.l.butter)
+        butter[start:end] = iir_filter(self.num, self.den, p, butter, start, end)
+
 class LaguerreFilter(bt.Indicator):
 
     lines = ('filter', 'p', 'L0', 'L1', 'L2', 'L3')
@@ -825,15 +1138,19 @@ class LaguerreFilter(bt.Indicator):
 
     def __init__(self):
         self.addminperiod(30)
-        self.alpha = 2/(self.p.period+1)
+        self.alpha = a = 2/(self.p.period+1)
         self.l.p = (self.data.high + self.data.low)/2
 
+        # Filter Coefficients for once()
+        self.l0_num, self.l0_den = [a], [1.0, -(1-a)]
+        self.ln_num, self.ln_den = [-(1-a), 1.0], [1.0, -(1-a)]
+
     def prenext(self):
 
         self.l.L0[0] = self.l.p[0]
-        self.l.L1[0] = self.l.p[-1]
-        self.l.L2[0] = self.l.p[-2]
-        self.l.L3[0] = self.l.p[-2]
+        self.l.L1[0] = lagged(self.l.p, 1)
+        self.l.L2[0] = lagged(self.l.p, 2)
+        self.l.L3[0] = lagged(self.l.p, 2)
 
     def next(self):
         a = self.alpha
@@ -844,6 +1161,24 @@ class LaguerreFilter(bt.Indicator):
         self.l.L3[0] = -(1 - a) * self.l.L2[0] + self.l.L2[-1] + (1 - a) * self.l.L3[-1]
         self.l.filter[0] = (self.l.L0[0] + 2*self.l.L1[0] + 2*self.l.L2[0] + self.l.L3[0])/6
 
+    def preonce(self, start, end):
+        p = as_array(self.l.p)
+        L0, L1, L2, L3 = [as_array(l) for l in (self.l.L0, self.l.L1, self.l.L2, self.l.L3)]
+        for i in range(start, end):
+            L0[i] = p[i]
+            L1[i] = p[max(i-1, 0)]
+            L2[i] = p[max(i-2, 0)]
+            L3[i] = p[max(i-2, 0)]
+
+    def once(self, start, end):
+        p = as_array(self.l.p)
+        L0, L1, L2, L3 = [as_array(l) for l in (self.l.L0, self.l.L1, self.l.L2, self.l.L3)]
+        L0[start:end] = iir_filter(self.l0_num, self.l0_den, p, L0, start, end)
+        L1[start:end] = iir_filter(self.ln_num, self.ln_den, L0, L1, start, end)
+        L2[start:end] = iir_filter(self.ln_num, self.ln_den, L1, L2, start, end)
+        L3[start:end] = iir_filter(self.ln_num, self.ln_den, L2, L3, start, end)
+        as_array(self.l.filter)[start:end] = (L0[start:end] + 2*L1[start:end] + 2*L2[start:end] + L3[start:end])/6
+
 class AdaptiveLaguerreFilter(bt.Indicator):
 
     lines = ('filter', 'p', 'L0', 'L1', 'L2', 'L3')
@@ -869,27 +1204,52 @@ class AdaptiveLaguerreFilter(bt.Indicator):
         self.addminperiod(60)
         self.l.p = (self.data.high + self.data.low) / 2
 
+        # Window of the last length |p - previous filter| values, kept in
+        # arrival order and sorted (min, max and median are then lookups)
+        self.diffs = collections.deque()
+        self.ranked = []
+        self.alpha = 0.0
+
+    def update_alpha(self, diff):
+        """
+        Slides the window over a new difference and returns the filter alpha:
+        the median of the window normalized to its [min, max] range
+        """
+        self.diffs.append(diff)
+        bisect.insort(self.ranked, diff)
+        if len(self.diffs) > self.p.length:
+            del self.ranked[bisect.bisect_left(self.ranked, self.diffs.popleft())]
+
+        ranked = self.ranked
+        LL, HH = ranked[0], ranked[-1]
+        if HH - LL != 0.0:
+            n = len(ranked)
+            median = ranked[n//2] if n % 2 else (ranked[n//2-1] + ranked[n//2])/2
+            self.alpha = (median - LL)/(HH - LL)
+        return self.alpha
+
+    def seed(self, p, filt, i):
+        # Fill the window with the differences of the bars before bar i
+        for j in range(i - self.p.length + 1, i):
+            self.update_alpha(abs(p[j] - filt[j-1]))
+
     def prenext(self):
+        # Lagged Prices Reach Back to the First Bar at Most (as in preonce)
+        p = self.l.p
+        n = len(self) - 1
+        self.l.filter[0] = p[0]
+        self.l.L0[0] = p[0]
+        self.l.L1[0] = p[-min(1, n)]
+        self.l.L2[0] = p[-min(2, n)]
+        self.l.L3[0] = p[-min(2, n)]
 
-        self.l.filter[0] = self.l.p[0]
-        self.l.L0[0] = self.l.p[0]
-        self.l.L1[0] = self.l.p[-1]
-        self.l.L2[0] = self.l.p[-2]
-        self.l.L3[0] = self.l.p[-2]
+    def nextstart(self):
+        self.seed(self.l.p.array, self.l.filter.array, self.l.p.idx)
+        self.next()
 
     def next(self):
         p = self.l.p
-        diff = [abs(self.l.p[-i]-self.l.filter[-(i+1)]) for i in range(self.p.length)]
-        HH = diff[0]
-        LL = diff[0]
-        for i in range(self.p.length):
-            if diff[i] > HH:
-                HH = diff[i]
-            if diff[i] < LL:
-                LL = diff[i]
-        data = [(i - LL)/(HH - LL) for i in diff]
-        if HH - LL != 0.0:
-            a = np.median(data)
+        a = self.update_alpha(abs(p[0] - self.l.filter[-1]))
 
         self.l.L0[0] = a*p[0] + (1-a)*self.l.L0[-1]
         self.l.L1[0] = -(1 - a) * self.l.L0[0] + self.l.L0[-1] + (1 - a) * self.l.L1[-1]
@@ -897,6 +1257,41 @@ class AdaptiveLaguerreFilter(bt.Indicator):
         self.l.L3[0] = -(1 - a) * self.l.L2[0] + self.l.L2[-1] + (1 - a) * self.l.L3[-1]
         self.l.filter[0] = (self.l.L0[0] + 2*self.l.L1[0] + 2*self.l.L2[0] + self.l.L3[0])/6
 
+    def preonce(self, start, end):
+        p = as_array(self.l.p)
+        as_array(self.l.filter)[start:end] = p[start:end]
+        L0, L1, L2, L3 = [as_array(l) for l in (self.l.L0, self.l.L1, self.l.L2, self.l.L3)]
+        for i in range(start, end):
+            L0[i] = p[i]
+            L1[i] = p[max(i-1, 0)]
+            L2[i] = p[max(i-2, 0)]
+            L3[i] = p[max(i-2, 0)]
+
+    def once(self, start, end):
+        # The alpha of a bar depends on the filter of the bar before, so this
+        # is a single pass over plain floats rather than array operations
+        p = as_array(self.l.p)
+        lines = [as_array(l) for l in (self.l.filter, self.l.L0, self.l.L1, self.l.L2, self.l.L3)]
+        if not self.diffs:
+            self.seed(p, lines[0], start)
+
+        f, L0, L1, L2, L3 = [float(line[start-1]) for line in lines]
+        out = [[] for line in lines]
+        for price in p[start:end].tolist():
+            a = self.update_alpha(abs(price - f))
+            b = 1 - a
+            n0 = a*price + b*L0
+            n1 = -b*n0 + L0 + b*L1
+            n2 = -b*n1 + L1 + b*L2
+            n3 = -b*n2 + L2 + b*L3
+            f = (n0 + 2*n1 + 2*n2 + n3)/6
+            L0, L1, L2, L3 = n0, n1, n2, n3
+            for values, x in zip(out, (f, n0, n1, n2, n3)):
+                values.append(x)
+
+        for line, values in zip(lines, out):
+            line[start:end] = values
+
 class SqueezeVolatility(bt.Indicator):
     # Clone of the TradingBear Squeeze Volatility Indicator
 
@@ -935,22 +1330,40 @@ class SqueezeVolatility(bt.Indicator):
 
         self.l.sqz = bt.If(bool,0.0,1.0)
 
+        # Rolling Range of High/Low and Linear Regression of the Momentum
+        self.highs = RollingExtrema(self.p.period_kc)
+        self.lows = RollingExtrema(self.p.period_kc)
+        self.linreg = RollingLinReg(self.p.period_kc)
+
+    def push_range(self):
+        # (Highest high + lowest low)/2 of the last period_kc bars
+        return (self.highs.push(self.data.high[0])[1] + self.lows.push(self.data.low[0])[0])/2
+
     def prenext(self):
 
+        self.push_range()
         self.l.y[0] = 0.0#self.data.close[0]
+        self.linreg.push(0.0)
 
     def next(self):
 
-        h = max(self.data.high.get(size=self.p.period_kc))
-        l = min(self.data.low.get(size=self.p.period_kc))
-        av1 = (h+l)/2
+        av1 = self.push_range()
         av2 = (av1 + self.l.ma[0])/2
         self.l.y[0] = self.data.close[0] - av2
 
-        # Perform Linear Regression
-        x = np.arange(0,self.p.period_kc,1)
-        slope, intercept, r_value, p_value, std_err = stats.linregress(x, self.l.y.get(size=self.p.period_kc))
-        self.l.hist[0] = intercept + slope*(self.p.period_kc - 1.0).as_integer_ratio()
+        # Linear Regression Value at the Current Bar
+        self.l.hist[0] = self.linreg.push(self.l.y[0])
+
+    def preonce(self, start, end):
+        as_array(self.l.y)[start:end] = 0.0
+
+    def once(self, start, end):
+        n = self.p.period_kc
+        h = rolling_max(as_array(self.data.high), n, start, end)
+        l = rolling_min(as_array(self.data.low), n, start, end)
+        y = as_array(self.l.y)
+        y[start:end] = as_array(self.data.close)[start:end] - ((h+l)/2 + as_array(self.l.ma)[start:end])/2
+        as_array(self.l.hist)[start:end] = rolling_linreg(y[:end], n, start, end)
 
 class SchaffTrendCycle(bt.Indicator):
 
@@ -983,6 +1396,14 @@ class SchaffTrendCycle(bt.Indicator):
         self.addminperiod(self.p.slow)
         self.l.macd = bt.indicators.MACD(self.data,period_me1=self.p.fast,period_me2=self.p.slow)
 
+        # Rolling Extremes of macd and pf Over the Cycle
+        self.macd_window = RollingExtrema(self.p.cycle)
+        self.pf_window = RollingExtrema(self.p.cycle)
+
+        # Smoothing Coefficients for once()
+        k = self.p.factor
+        self.num, self.den = [k], [1.0, -(1-k)]
+
     def prenext(self):
 
         self.l.f1[0] = self.data.close[0]
@@ -990,20 +1411,47 @@ class SchaffTrendCycle(bt.Indicator):
         self.l.f2[0] = self.data.high[0]
         self.l.schaff[0] = self.data.low[0]
 
+    def nextstart(self):
+        # Windows of the bars before this one
+        for i in range(self.p.cycle-1, 0, -1):
+            self.macd_window.push(self.l.macd[-i])
+            self.pf_window.push(self.l.pf[-i])
+        self.next()
+
     def next(self):
 
-        v1 = min(self.l.macd.get(size=self.p.cycle))
-        v2 = max(self.l.macd.get(size=self.p.cycle))-v1
+        v1, v2 = self.macd_window.push(self.l.macd[0])
+        v2 = v2-v1
 
         self.l.f1[0] = 100*(self.l.macd[0]-v1)/v2 if v2 > 0 else self.l.f1[-1]
         self.l.pf[0] = self.l.pf[-1] + (self.p.factor*(self.l.f1[0]-self.l.pf[-1]))
 
-        v3 = min(self.l.pf.get(size=self.p.cycle))
-        v4 = max(self.l.pf.get(size=self.p.cycle))-v3
+        v3, v4 = self.pf_window.push(self.l.pf[0])
+        v4 = v4-v3
 
         self.l.f2[0] = 100*(self.l.pf[0]-v3)/v4 if v4 > 0 else self.l.f2[-1]
         self.l.schaff[0] = self.l.schaff[-1] + (self.p.factor*(self.l.f2[0]-self.l.schaff[-1]))
 
+    def preonce(self, start, end):
+        for line, src in ((self.l.f1, self.data.close), (self.l.pf, self.data.open),
+                          (self.l.f2, self.data.high), (self.l.schaff, self.data.low)):
+            as_array(line)[start:end] = as_array(src)[start:end]
+
+    def once(self, start, end):
+        c = self.p.cycle
+        macd, f1, pf, f2, schaff = [as_array(l) for l in (self.l.macd, self.l.f1, self.l.pf, self.l.f2, self.l.schaff)]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v1 = rolling_min(macd, c, start, end)
+            v2 = rolling_max(macd, c, start, end)-v1
+            f1[start:end] = fill_forward(100*(macd[start:end]-v1)/v2, v2 > 0, f1[start-1])
+            pf[start:end] = iir_filter(self.num, self.den, f1, pf, start, end)
+
+            v3 = rolling_min(pf, c, start, end)
+            v4 = rolling_max(pf, c, start, end)-v3
+            f2[start:end] = fill_forward(100*(pf[start:end]-v3)/v4, v4 > 0, f2[start-1])
+            schaff[start:end] = iir_filter(self.num, self.den, f2, schaff, start, end)
+
 class SignalFiller(bt.Indicator):
 
     lines = ('signal',)
@@ -1079,6 +1527,11 @@ class DamianiVolatmeter(bt.Indicator):
         self.l.aS = bt.indicators.AverageTrueRange(self.data, period=self.p.atr_slow)
         self.l.sS = bt.indicators.StandardDeviation(self.data.close, period=self.p.std_slow)
 
+    def qbuffer(self, savemem=0):
+        super(DamianiVolatmeter, self).qbuffer(savemem=savemem)
+        # v is read 3 bars back, further than its own minimum period
+        self.l.v.minbuffer(4)
+
     def prenext(self):
 
         self.l.v[0] = 0.0050
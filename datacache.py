@@ -0,0 +1,187 @@
+import backtrader as bt
+from custom_functions import *
+import numpy as np
+import hashlib
+import json
+import time
+import os
+
+# Binary Columnar Cache for the Dukascopy CSVs
+#
+# Each CSV is converted once into a .npy file holding a (6, rows) float64
+# array - one contiguous row per column in COLUMNS - next to a .json file
+# with the checksum of the CSV it was built from. Later loads memory-map the
+# .npy file instead of parsing the CSV again.
+
+COLUMNS = ('datetime', 'open', 'high', 'low', 'close', 'volume')
+
+# Bump when the layout or the parsing in read_csv_columns changes
+CACHE_VERSION = 1
+
+
+def file_checksum(path, blocksize=1 << 20):
+    """
+    SHA1 of a file, read in blocks
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_paths(path, cache_dir, suffix=''):
+    # suffix tells apart tables built from the same source (e.g. '_H1' for resampled bars)
+    name = os.path.splitext(os.path.basename(path))[0] + suffix
+    base = os.path.join(cache_dir, name)
+    return base + '.npy', base + '.json'
+
+
+def cache_is_valid(path, cache_dir, suffix=''):
+    """
+    Checks the cache of a CSV against its source file. A matching size and
+    mtime is trusted as is, otherwise the checksum decides (and the stored
+    mtime is refreshed when only the timestamp moved).
+    """
+    npy, meta_path = cache_paths(path, cache_dir, suffix)
+    if not os.path.exists(npy) or not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = os.stat(path)
+    if meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime:
+        return True
+
+    if meta['size'] != stat.st_size or meta['sha1'] != file_checksum(path):
+        return False
+
+    meta['mtime'] = stat.st_mtime
+    write_meta(meta_path, meta)
+    return True
+
+
+def write_meta(meta_path, meta):
+    tmp = meta_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def build_cache(path, cache_dir='Data/cache/'):
+    """
+    Converts a single CSV into its columnar cache
+    :param path: Path to the source CSV
+    :param cache_dir: Folder holding the cache files
+    :return: Path to the .npy file
+
+    """
+    stat = os.stat(path)
+    sha1 = file_checksum(path)
+    columns = read_csv_columns(path)
+    table = np.array([columns[c] for c in COLUMNS], dtype=np.float64)
+    return write_table(path, cache_dir, table, sha1, stat)
+
+
+def write_table(path, cache_dir, table, sha1, stat, suffix='', **extra):
+    """
+    Stores a (len(COLUMNS), rows) table as the cache of a source file
+    :param path: Path to the source file
+    :param cache_dir: Folder holding the cache files
+    :param table: float64 array, one row per column in COLUMNS
+    :param sha1: Checksum of the source file (see file_checksum)
+    :param stat: os.stat of the source file, taken before it was read
+    :param suffix: Name suffix of the table (see cache_paths)
+    :param extra: Further entries for the .json file
+    :return: Path to the .npy file
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    npy, meta_path = cache_paths(path, cache_dir, suffix)
+
+    # Write to a temporary file first so readers never see a partial cache
+    tmp = npy + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, table)
+    os.replace(tmp, npy)
+
+    meta = dict(version=CACHE_VERSION,
+                sha1=sha1,
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                rows=table.shape[1])
+    meta.update(extra)
+    write_meta(meta_path, meta)
+    return npy
+
+
+def load_columns(path, cache_dir='Data/cache/'):
+    """
+    Memory-maps the columns of a CSV, (re)building the cache when it is missing or stale
+    :param path: Path to the source CSV
+    :param cache_dir: Folder holding the cache files
+    :return: Dict of column name -> read-only array, usable as ArrayData columns
+
+    """
+    if not cache_is_valid(path, cache_dir):
+        build_cache(path, cache_dir)
+    npy, _ = cache_paths(path, cache_dir)
+    table = np.load(npy, mmap_mode='r')
+    return dict(zip(COLUMNS, table))
+
+
+def source_checksum(path, cache_dir='Data/cache/'):
+    """
+    Checksum of a CSV as recorded in its cache (built when missing or stale)
+    """
+    if not cache_is_valid(path, cache_dir):
+        build_cache(path, cache_dir)
+    _, meta_path = cache_paths(path, cache_dir)
+    with open(meta_path, 'r') as f:
+        return json.load(f)['sha1']
+
+
+def convert_all(dpath='Data/', cache_dir='Data/cache/'):
+    """
+    One-time conversion of every CSV in the data folder
+    :return: List of the pair names that had to be (re)built
+
+    """
+    paths, names = file_browser(dpath)
+    built = []
+    for path, name in zip(paths, names):
+        if not cache_is_valid(dpath+path, cache_dir):
+            build_cache(dpath+path, cache_dir)
+            built.append(name)
+    return built
+
+
+class ColumnarData(ArrayData):
+    '''
+    Data feed that reads straight from the columnar cache of a Dukascopy CSV.
+    Pass the CSV path as dataname - the cache is built on first use.
+    '''
+
+    params = (
+        ('cache_dir', 'Data/cache/'),
+    )
+
+    def _columns(self):
+        return load_columns(self.p.dataname, self.p.cache_dir)
+
+
+if __name__ == '__main__':
+
+    t0 = time.time()
+    built = convert_all()
+    t1 = time.time()
+    print('Converted {} files in {:.2f}s'.format(len(built), t1-t0))
+
+    paths, names = file_browser()
+    t0 = time.time()
+    feeds = [load_columns('Data/'+path) for path in paths]
+    t1 = time.time()
+    print('Mapped {} pairs in {:.2f}ms'.format(len(feeds), (t1-t0)*1000))
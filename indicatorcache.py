@@ -0,0 +1,174 @@
+import backtrader as bt
+import numpy as np
+import hashlib
+import inspect
+import os
+import sys
+
+# Persistent On-Disk Cache of Indicator Outputs
+#
+# Every line of an indicator built on a data feed is stored as an array in a
+# .npz file named after a key made from the indicator class, its params, a
+# hash of the feed contents and a hash of the indicator source code. On a hit
+# the indicator is replaced by a CachedIndicator that only copies the stored
+# arrays into its lines.
+
+
+def feed_hash(data):
+    """
+    Content hash of a preloaded data feed (datetime and OHLCV)
+    :return: Hex digest, or None if the feed has not been preloaded
+
+    """
+    if not len(data.close.array) or len(data.close.array) != data.buflen():
+        return None
+    sha = hashlib.sha1()
+    for line in (data.datetime, data.open, data.high, data.low, data.close, data.volume):
+        sha.update(line.array.tobytes())
+    return sha.hexdigest()
+
+
+_code_versions = dict()
+
+
+def code_version(cls):
+    """
+    Hash of the source of the modules defining an indicator class and its
+    indicator base classes, plus the backtrader version. Whole modules are
+    hashed so editing a helper function or an indicator the class builds
+    internally (e.g. the SuperSmoothFilter of RoofingFilter) also
+    invalidates its cached outputs
+    """
+    if cls not in _code_versions:
+        sha = hashlib.sha1(bt.__version__.encode())
+        modules = []
+        for klass in inspect.getmro(cls):
+            if klass in (bt.Indicator, bt.LineActions) or not issubclass(klass, bt.Indicator):
+                continue
+            module = sys.modules.get(klass.__module__)
+            if module is None or module in modules or module.__name__.split('.')[0] == 'backtrader':
+                # Backtrader Modules are Covered by its Version
+                continue
+            modules.append(module)
+            try:
+                sha.update(inspect.getsource(module).encode())
+            except (OSError, TypeError):
+                sha.update(klass.__qualname__.encode())
+        _code_versions[cls] = sha.hexdigest()
+    return _code_versions[cls]
+
+
+def cache_key(cls, params, data_hash):
+    """
+    Key for a given (indicator, params, dataset) combination
+    :param cls: Indicator class
+    :param params: Dict of indicator params (plotting params are ignored)
+    :param data_hash: Content hash of the input feed (see feed_hash)
+
+    """
+    items = sorted((k, repr(v)) for k, v in params.items() if k != 'plot')
+    ident = repr((cls.__module__, cls.__qualname__, items, data_hash, code_version(cls)))
+    return hashlib.sha1(ident.encode()).hexdigest()
+
+
+class IndicatorCache(object):
+
+    def __init__(self, cache_dir='Data/cache/indicators/', max_bytes=512*1024**2):
+        """
+        Size-bounded store of indicator outputs. Least recently used entries
+        are evicted once the store grows past max_bytes.
+        :param cache_dir: Folder holding the .npz entries
+        :param max_bytes: Upper bound on the total size of the entries
+
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def get(self, key):
+        """
+        :return: (list of line arrays, minperiod) or None on a miss
+
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                lines = [entry['line%d' % i] for i in range(int(entry['nlines']))]
+                minperiod = int(entry['minperiod'])
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        return lines, minperiod
+
+    def put(self, key, lines, minperiod):
+        path = self.path(key)
+        tmp = path + '.tmp'
+        arrays = {'line%d' % i: np.asarray(l, dtype=np.float64) for i, l in enumerate(lines)}
+        with open(tmp, 'wb') as f:
+            np.savez(f, nlines=len(lines), minperiod=minperiod, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(e[1] for e in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+
+class CachedIndicator(bt.Indicator):
+    '''
+    Stand-in for an indicator whose outputs came from the cache. Lines are
+    declared by the subclasses made in cached_class so the stand-in keeps the
+    line names of the indicator it replaces.
+    '''
+
+    params = (
+        ('arrays', None),
+        ('minper', 1),
+    )
+
+    def __init__(self):
+        self.addminperiod(self.p.minper)
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        i = len(self) - 1
+        for line, arr in zip(self.lines, self.p.arrays):
+            line[0] = arr[i]
+
+    def preonce(self, start, end):
+        self.once(start, end)
+
+    def once(self, start, end):
+        for line, arr in zip(self.lines, self.p.arrays):
+            # Zero-copy view of the line buffer, as custom_indicators.as_array
+            np.frombuffer(line.array, dtype=np.float64)[start:end] = arr[start:end]
+
+
+_cached_classes = dict()
+
+
+def cached_class(cls):
+    """
+    CachedIndicator subclass with the same lines as cls
+    """
+    if cls not in _cached_classes:
+        _cached_classes[cls] = type('_Cached' + cls.__name__, (CachedIndicator,), dict(
+            lines=cls.lines._getlines(),
+            plotinfo=dict(plotname=cls.__name__),
+        ))
+    return _cached_classes[cls]
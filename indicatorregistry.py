@@ -0,0 +1,220 @@
+import backtrader as bt
+import importlib
+
+# Declarative Registry of the Strategy Indicators
+#
+# Every indicator IndicatorGenerator can build is declared once below: its
+# class (named by module path and only imported the first time it is
+# built), the names of its params in the order NNFX configs list them, the
+# roles it can fill with the signal each role derives from it, its warm-up
+# length (the _minperiod the class ends up with for those params) and
+# whether it has a vectorized kernel.
+# Building an indicator for a role is a dict lookup, and custom_indicators
+# is only imported by processes that build one of its indicators.
+
+ROLES = ('baseline', 'entry', 'volume', 'exit')
+
+
+def load(target):
+    """
+    Imports a class given by its dotted path, e.g. 'custom_indicators.iTrend'
+    """
+    module, name = target.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)
+
+
+class IndicatorSpec(object):
+
+    def __init__(self, name, target, params, roles, warmup, vectorized):
+        """
+        :param name: Indicator name used in NNFX configs
+        :param target: Dotted path of the indicator class, or None when the class is the first param (as for ma)
+        :param params: Names of the params, in config order. Names the class has as params are handed to it,
+                       the others (e.g. the tdfi threshold) only shape the signals
+        :param roles: Dict of role (one of ROLES) -> signal function(indicator, params dict, plot). The
+                      baseline signal is the line price crosses, the others are the binary signal itself
+        :param warmup: Bars before the indicator gives values - an int, or a function of the params dict
+        :param vectorized: Whether the class and every indicator it builds have a hand-written once(), so
+                           runonce never steps through next() bar by bar (backtrader generates a once()
+                           that does from next(), which does not count) - a bool, or a function of the
+                           params dict
+
+        """
+        self.name = name
+        self.target = target
+        self.params = tuple(params)
+        self.roles = roles
+        self._warmup = warmup
+        self._vectorized = vectorized
+        self._cls = None
+
+    @property
+    def cls(self):
+        # Imported on first use only
+        if self._cls is None and self.target is not None:
+            self._cls = load(self.target)
+        return self._cls
+
+    def named(self, params):
+        return dict(zip(self.params, params))
+
+    def resolve(self, params):
+        """
+        Indicator class and keyword params for a params tuple of a config
+        """
+        cls = self.cls if self.target is not None else params[0]
+        keys = cls.params._getkeys()
+        return cls, {k: v for k, v in self.named(params).items() if k in keys}
+
+    def warmup(self, params):
+        """
+        Bars the indicator needs before its first value, for a params tuple of a config
+        """
+        return self._warmup(self.named(params)) if callable(self._warmup) else self._warmup
+
+    def vectorized(self, params):
+        """
+        Whether runonce computes the indicator with array kernels only, for a params tuple of a config
+        """
+        return self._vectorized(self.named(params)) if callable(self._vectorized) else self._vectorized
+
+
+# Registry - Indicator Name -> IndicatorSpec
+REGISTRY = dict()
+
+
+def register(name, target, params, roles, warmup, vectorized=True):
+    REGISTRY[name] = IndicatorSpec(name, target, params, roles, warmup, vectorized)
+
+
+# Signal Builders Shared by Many Indicators
+
+def line(name):
+    # The indicator line itself (baselines)
+    return lambda ind, p, plot: getattr(ind, name)
+
+
+def itself(ind, p, plot):
+    # The indicator as a whole (its first line)
+    return ind
+
+
+def cmp(a, b):
+    # +1/-1 as line a is above/below line b (or a constant)
+    return lambda ind, p, plot: bt.Cmp(getattr(ind, a), getattr(ind, b) if isinstance(b, str) else b)
+
+
+def threshold(name):
+    # +1/-1 while the line is beyond +/- the 'threshold' param, 0 in between
+    return lambda ind, p, plot: bt.If(getattr(ind, name) > p['threshold'], 1.0, 0.0) + \
+                                bt.If(getattr(ind, name) < -p['threshold'], -1.0, 0.0)
+
+
+# Signal Builders of a Single Indicator
+
+def ttf_entry(ind, p, plot):
+    long = bt.indicators.CrossUp(ind.ttf, -100.0, plot=plot)
+    short = bt.indicators.CrossDown(ind.ttf, 100.0, plot=plot)
+    return long + -1*short
+
+
+def schaff_entry(ind, p, plot):
+    buy = bt.indicators.CrossUp(ind.schaff, 25.0, plot=plot)
+    sell = bt.indicators.CrossDown(ind.schaff, 75.0, plot=plot)
+    return load('custom_indicators.SignalFiller')(buy - sell, plot=plot).signal
+
+
+def cvi_volume(ind, p, plot):
+    return ind.cvi > 0.0
+
+
+def wae_volume(ind, p, plot):
+    buy = bt.All(ind.utrend > ind.exp, ind.utrend > ind.dead, ind.exp > ind.dead)
+    sell = bt.All(ind.dtrend > ind.exp, ind.dtrend > ind.dead, ind.exp > ind.dead)
+    return buy - sell
+
+
+def damiani_volume(ind, p, plot):
+    return bt.If(bt.Cmp(ind.v, ind.t) > 0, 1.0, 0.0)
+
+
+def heikenashi_exit(ind, p, plot):
+    # Signal once the candles kept the same colour for the last 'bars' bars
+    ups = [ind.signal(-i if i > 0 else i) == 1.0 for i in range(0, p['bars'])]
+    downs = [ind.signal(-i if i > 0 else i) == -1.0 for i in range(0, p['bars'])]
+    return bt.Or(bt.All(*ups), bt.All(*downs)) * ind.signal
+
+
+# Backtrader Moving Averages Without a once() of Their Own (and Their Aliases, e.g. EC)
+NEXT_ONLY_MOVAVS = (bt.indicators.ZeroLagIndicator, bt.indicators.DicksonMovingAverage)
+
+# Baselines
+
+# Ichimoku Leaves senkou (52) and senkou_lead (26) at their Defaults
+register('kijun', 'backtrader.indicators.Ichimoku', ('kijun',),
+         dict(baseline=line('kijun_sen')), warmup=lambda p: max(p['kijun'], 52) + 26)
+register('ma', None, ('movav', 'period'),
+         dict(baseline=itself), warmup=lambda p: p['period'],
+         vectorized=lambda p: not issubclass(p['movav'], NEXT_ONLY_MOVAVS))
+register('fama', 'custom_indicators.MAMA', ('fast', 'slow'),
+         dict(baseline=line('FAMA')), warmup=40)
+register('laguerre', 'custom_indicators.LaguerreFilter', ('period',),
+         dict(baseline=line('filter')), warmup=30)
+register('alaguerre', 'custom_indicators.AdaptiveLaguerreFilter', ('length',),
+         dict(baseline=line('filter')), warmup=60)
+register('butter', 'custom_indicators.Butterworth', ('period', 'poles'),
+         dict(baseline=line('butter')), warmup=10)
+
+# Confirmation Indicators
+
+register('itrend', 'custom_indicators.iTrend', ('period',),
+         dict(baseline=line('itrend'), entry=cmp('trigger', 'itrend'), exit=cmp('trigger', 'itrend')),
+         warmup=lambda p: p['period'])
+register('mama', 'custom_indicators.MAMA', ('fast', 'slow'),
+         dict(baseline=line('MAMA'), entry=cmp('MAMA', 'FAMA'), exit=cmp('MAMA', 'FAMA')),
+         warmup=40)
+register('cybercycle', 'custom_indicators.CyberCycle', ('period',),
+         dict(entry=cmp('trigger', 'cycle')), warmup=lambda p: p['period'])
+register('adaptivecybercycle', 'custom_indicators.AdaptiveCyberCycle', ('period', 'lag'),
+         dict(entry=cmp('signal', 'trigger')), warmup=lambda p: p['period'])
+register('ssl', 'custom_indicators.SSLChannel', ('period',),
+         dict(entry=cmp('sslu', 'ssld'), exit=cmp('sslu', 'ssld')),
+         warmup=lambda p: p['period'], vectorized=False)
+register('aroon', 'backtrader.indicators.AroonUpDown', ('period',),
+         dict(entry=cmp('aroonup', 'aroondown')), warmup=lambda p: p['period'] + 1)
+register('ttf', 'custom_indicators.TrendTriggerFactor', ('period',),
+         dict(entry=ttf_entry), warmup=lambda p: 2*p['period'] + 1)
+register('tdfi', 'custom_indicators.TrendDirectionForceIndex', ('period', 'threshold'),
+         dict(entry=threshold('ntdf'), volume=threshold('ntdf')),
+         warmup=lambda p: 4*p['period'] - 1)
+register('cmf', 'custom_indicators.ChaikinMoneyFlow', ('period',),
+         dict(entry=cmp('money_flow', 0.0)), warmup=lambda p: p['period'])
+register('ash', 'custom_indicators.ASH', ('period', 'smoothing', 'mode', 'rsifactor', 'movav', 'smoothav', 'pointsize'),
+         dict(entry=cmp('bulls', 'bears')), warmup=lambda p: p['period'] + p['smoothing'])
+# roof and idosc Finish with the Bar by Bar iFisher
+register('roof', 'custom_indicators.RoofingFilter', ('hp_period', 'ss_period', 'smooth'),
+         dict(entry=cmp('iroof', 0.0)), warmup=lambda p: 37 + p['smooth'], vectorized=False)
+register('dosc', 'custom_indicators.DecyclerOscillator', ('hp_period',),
+         dict(entry=cmp('osc', 0.0), exit=cmp('osc', 0.0)), warmup=20)
+register('idosc', 'custom_indicators.iDecycler', ('hp_period', 'smooth'),
+         dict(entry=cmp('idosc', 0.0)), warmup=lambda p: 38 + p['smooth'], vectorized=False)
+register('schaff', 'custom_indicators.SchaffTrendCycle', ('fast', 'slow', 'cycle', 'factor'),
+         dict(entry=schaff_entry), warmup=lambda p: max(p['fast'], p['slow']) + 8)
+
+# Volume Indicators
+
+register('cvi', 'custom_indicators.ChaikinVolatility', ('ema_period', 'roc_period'),
+         dict(volume=cvi_volume), warmup=lambda p: p['ema_period'] + p['roc_period'])
+register('wae', 'custom_indicators.WaddahAttarExplosion', ('sensitivity', 'fast', 'slow', 'channel', 'mult', 'dead'),
+         dict(volume=wae_volume), warmup=lambda p: max(max(p['fast'], p['slow']) + 8, p['channel'], 51))
+register('squeeze', 'custom_indicators.SqueezeVolatility', ('period', 'mult', 'period_kc', 'mult_kc', 'movav'),
+         dict(volume=line('sqz')), warmup=lambda p: max(p['period'], 2*p['period_kc']))
+register('damiani', 'custom_indicators.DamianiVolatmeter',
+         ('atr_fast', 'std_fast', 'atr_slow', 'std_slow', 'thresh', 'lag_supress'),
+         dict(volume=damiani_volume), warmup=lambda p: max(p['atr_fast'] + 1, p['std_fast'], p['atr_slow'] + 1, p['std_slow']),
+         vectorized=False)
+
+# Exit Indicators
+
+register('heikenashi', 'custom_indicators.HeikenAshi', ('bars',),
+         dict(exit=heikenashi_exit), warmup=2, vectorized=False)
@@ -0,0 +1,155 @@
+import backtrader as bt
+import numpy as np
+import threading
+import queue
+import json
+import os
+
+# Buffered Event Journal
+#
+# Order, trade and decision events of a run are recorded as fixed-schema
+# rows of a preallocated NumPy record buffer. A full buffer is handed to a
+# background thread that appends it to a JSONL or a raw binary file, while
+# recording carries on in a fresh buffer, so a full audit trail costs a row
+# assignment per event instead of formatting and printing it. A journal
+# file loads back as a record array with load_journal.
+
+# Event Kinds
+ORDER, TRADE, DECISION = range(3)
+KINDS = ('order', 'trade', 'decision')
+
+# Decisions Taken by the Strategy (stored in the status field of decision events)
+DECISIONS = ('too_far', 'pullback', 'bridge_too_far', 'continuation', 'enter', 'exit')
+
+# Row Layout
+EVENT_DTYPE = np.dtype([
+    ('kind', np.int8),     # ORDER, TRADE or DECISION
+    ('dt', np.float64),    # backtrader date number of the bar
+    ('pair', 'S6'),
+    ('ref', np.int64),     # order or trade reference (0 for decisions)
+    ('status', np.int8),   # order status, 1 for a closed trade or the DECISIONS index
+    ('size', np.float64),
+    ('price', np.float64),
+    ('value', np.float64),  # commission of an order, gross pnl of a trade
+    ('pnl', np.float64),   # net pnl of a trade
+])
+
+
+def _jsonl_rows(rows):
+    # One object per event with the codes spelled out
+    lines = []
+    for row in rows.tolist():
+        kind, dt, pair, ref, status, size, price, value, pnl = row
+        if kind == ORDER:
+            status = bt.Order.Status[status]
+        elif kind == DECISION:
+            status = DECISIONS[status]
+        lines.append(json.dumps(dict(kind=KINDS[kind], dt=dt, pair=pair.decode(), ref=ref, status=status,
+                                     size=size, price=price, value=value, pnl=pnl)))
+    return '\n'.join(lines) + '\n'
+
+
+class Journal(object):
+
+    def __init__(self, path, capacity=4096):
+        """
+        Opens a journal file (replacing an existing one)
+        :param path: Output file - .jsonl for JSON lines, anything else for raw EVENT_DTYPE rows
+        :param capacity: Events per buffer
+
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.binary = not path.endswith('.jsonl')
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.count = 0
+        self.written = 0
+
+        # Filled Buffers Travel to the Writer, Written Ones Come Back for Reuse
+        self._full = queue.Queue()
+        self._spare = queue.Queue()
+        self._file = open(path, 'wb' if self.binary else 'w')
+        self._writer = threading.Thread(target=self._write, name='journal-writer', daemon=True)
+        self._writer.start()
+
+    def _write(self):
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            buffer, count = item
+            if self.binary:
+                buffer[:count].tofile(self._file)
+            else:
+                self._file.write(_jsonl_rows(buffer[:count]))
+            self._spare.put(buffer)
+        self._file.close()
+
+    def record(self, kind, dt, pair, ref=0, status=0, size=0.0, price=0.0, value=0.0, pnl=0.0):
+        """
+        Adds an event (see EVENT_DTYPE for the fields)
+        """
+        self.buffer[self.count] = (kind, dt, pair, ref, status, size, price, value, pnl)
+        self.count += 1
+        if self.count == self.capacity:
+            self.flush()
+
+    def order(self, order):
+        ex = order.executed
+        self.record(ORDER, order.data.datetime[0], order.data._name, order.ref, order.status,
+                    ex.size if ex.size else order.created.size, ex.price if ex.price else (order.price or 0.0),
+                    ex.comm)
+
+    def trade(self, trade):
+        self.record(TRADE, trade.data.datetime[0], trade.data._name, trade.ref, 1 if trade.isclosed else 0,
+                    trade.size, trade.price, trade.pnl, trade.pnlcomm)
+
+    def decision(self, d, decision, size=0.0, price=0.0):
+        self.record(DECISION, d.datetime[0], d._name, 0, DECISIONS.index(decision), size, price)
+
+    def flush(self):
+        """
+        Hands the buffered events to the writer thread
+        """
+        if not self.count:
+            return
+        self._full.put((self.buffer, self.count))
+        self.written += self.count
+        try:
+            self.buffer = self._spare.get_nowait()
+        except queue.Empty:
+            self.buffer = np.zeros(self.capacity, dtype=EVENT_DTYPE)
+        self.count = 0
+
+    def close(self):
+        """
+        Writes out the remaining events and waits for the writer to finish
+        """
+        self.flush()
+        self._full.put(None)
+        self._writer.join()
+
+
+def load_journal(path):
+    """
+    Reads a journal file back
+    :param path: File written by a Journal
+    :return: Record array of EVENT_DTYPE rows
+
+    """
+    if not path.endswith('.jsonl'):
+        return np.fromfile(path, dtype=EVENT_DTYPE)
+
+    statuses = {name: i for i, name in enumerate(bt.Order.Status)}
+    statuses.update({name: i for i, name in enumerate(DECISIONS)})
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            e = json.loads(line)
+            status = statuses[e['status']] if isinstance(e['status'], str) else e['status']
+            rows.append((KINDS.index(e['kind']), e['dt'], e['pair'], e['ref'], status,
+                         e['size'], e['price'], e['value'], e['pnl']))
+    return np.array(rows, dtype=EVENT_DTYPE)
@@ -3,15 +3,181 @@ import datetime  # For datetime objects
 import os.path  # To manage paths
 import sys  # To find out the script name (in argv[0])
 import backtrader as bt
-from custom_indicators import *
 from custom_functions import *
+from datacache import ColumnarData
+from indicatorcache import IndicatorCache
+from profiler import Profiler
+from journal import Journal
 import BinaryGenerator as BG
-import itertools
+from indicatorregistry import REGISTRY
 import time
 import os
 import glob
 
 
+# Series the Strategy Trades On for Each Feed
+SIGNALS = ('atr', 'baseline', 'too_far', 'c1', 'c2', 'volume', 'exit')
+
+# Bars the Trading Logic Reads Back on a Series (the flip trackers catching up, pullback)
+LOOKBACK = dict(baseline=30, c1=30, too_far=2)
+
+# Strategy Methods Timed in Profiling Mode
+PROFILED_METHODS = ('refresh_conditions', 'clean_orders', 'check_positions', 'pullback', 'continuation',
+                    'bridge_too_far', 'decide_trade', 'size_position', 'conversion_rate',
+                    'update_flips', 'notify_order', 'notify_trade')
+
+# Bars Since the Last C1 Reading Against a Baseline Cross Beyond which the Cross is a Bridge too Far
+BRIDGE_TOO_FAR = 9
+
+
+def build_signals(ig, p):
+    """
+    Builds the money management and binary role series for a single feed
+    :param ig: IndicatorGenerator of the feed
+    :param p: NNFX params
+    :return: Dict of SIGNALS name -> line
+
+    """
+    inds = dict()
+    # Money Management Indicators
+    inds['atr'] = ig.make_indicator(bt.indicators.ATR, period=p.atr_period, plot=False)
+    # Generate Strategy Binary Indicators
+    inds['baseline'], inds['too_far'] = ig.baseline_indicator(p.base_ind, p.base_params, plot=False)
+    inds['c1'] = ig.entry_indicator(p.c1_ind, p.c1_params, plot=False)
+    inds['c2'] = ig.entry_indicator(p.c2_ind, p.c2_params, plot=False)
+    inds['volume'] = ig.volume_indicator(p.volume_ind, p.volume_params, plot=False)
+    inds['exit'] = ig.exit_indicator(p.exit_ind, p.exit_params, plot=False)
+    return inds
+
+
+class FlipTracker(object):
+    '''
+    Baseline cross and C1 flip history of a single feed, updated in O(1) per bar so the
+    continuation and bridge too far rules read it instead of scanning back over the lines
+    '''
+
+    __slots__ = ('bars', 'since_cross', 'cross', 'flips', 'c1_positive', 'since_c1')
+
+    def __init__(self):
+        self.bars = 0
+        # Bars Since the Last Baseline Cross (0 on the Cross Bar) and its Direction
+        self.since_cross = float('inf')
+        self.cross = 0.0
+        # Changes of C1 Between Positive and Not Positive Over the Bars After the Cross
+        self.flips = 0
+        self.c1_positive = False
+        # Bars Since C1 Last Read +1 / -1
+        self.since_c1 = {1.0: float('inf'), -1.0: float('inf')}
+
+    def update(self, baseline, c1):
+        """
+        Moves the history on by a bar
+        :param baseline: Baseline cross signal of the bar (0 when price did not cross)
+        :param c1: C1 signal of the bar
+
+        """
+        positive = c1 > 0
+        if baseline != 0.0:
+            self.since_cross = 0
+            self.cross = baseline
+            self.flips = 0
+        else:
+            self.since_cross += 1
+            if self.since_cross > 1 and positive != self.c1_positive:
+                self.flips += 1
+        self.c1_positive = positive
+        for value in self.since_c1:
+            self.since_c1[value] = 0 if c1 == value else self.since_c1[value] + 1
+        self.bars += 1
+
+    def c1_since(self, value):
+        """
+        Bars since C1 last read value (inf if it never did)
+        """
+        return self.since_c1.get(value, float('inf'))
+
+
+def config_warmup(config):
+    """
+    Bars NNFX needs ahead of the first bar it trades on with a config: the longest warm-up
+    of its indicators (see indicatorregistry) plus the bars the trading logic reads back
+    :param config: NNFX params dict (missing params take their defaults)
+    :return: Number of bars, or None if an indicator of the config is not in the registry
+
+    """
+    p = dict(NNFX.params._getitems())
+    p.update(config)
+    bars = [p['atr_period'] + 1]
+    for role in ('base', 'c1', 'c2', 'volume', 'exit'):
+        spec = REGISTRY.get(p[role + '_ind'])
+        if spec is None:
+            return None
+        bars.append(spec.warmup(p[role + '_params']))
+    return max(bars) + LOOKBACK['baseline']
+
+
+def pip_size(pair):
+    return 0.01 if 'JPY' in (pair[:3], pair[3:]) else 0.0001
+
+
+def build_conversions(pairs, account):
+    """
+    Works out, once, how every pair converts into the account currency
+    :param pairs: Pair names of the feeds (e.g. 'EURJPY')
+    :param account: Account currency
+    :return: Dict of pair name -> dict with the pip size under 'pip', the sizing/commission
+             method under 'method' (0: counter is the account currency, 1: base is the
+             account currency, 2: neither) and the path under 'legs'. The legs are
+             (pair name, power) tuples whose closes, each raised to its power of 1 or -1,
+             multiply up to the counter currency bought by one unit of the account
+             currency, or None if the feeds hold no path
+
+    """
+    # Every pair is an edge between its currencies, walked forward (times its
+    # close) or in reverse (over its close). Forward edges come first so a
+    # direct quote wins over an inverted one.
+    edges = dict()
+    for pair in pairs:
+        edges.setdefault(pair[:3], []).append((pair[3:], pair, 1))
+    for pair in pairs:
+        edges.setdefault(pair[3:], []).append((pair[:3], pair, -1))
+
+    # Shortest path from the account currency to every currency (breadth-first)
+    paths = {account: ()}
+    queue = [account]
+    for currency in queue:
+        for other, pair, power in edges.get(currency, ()):
+            if other not in paths:
+                paths[other] = paths[currency] + ((pair, power),)
+                queue.append(other)
+
+    conversions = dict()
+    for pair in pairs:
+        base, counter = pair[:3], pair[3:]
+        conversions[pair] = dict(
+            pip=pip_size(pair),
+            method=0 if counter == account else 1 if base == account else 2,
+            legs=paths.get(counter),
+        )
+    return conversions
+
+
+def lean_cerebro(**kwargs):
+    """
+    Cerebro for bounded-memory runs over long histories and many pairs. Every line
+    only keeps the bars it is read back on (exactbars), the feeds are streamed
+    rather than preloaded and the standard observers are left out, so memory no
+    longer grows with the length of the history. Results match a regular run, but
+    the run cannot be plotted and indicator outputs are not cached.
+    :param kwargs: Further Cerebro params
+    :return: Cerebro
+
+    """
+    kwargs.setdefault('exactbars', 1)
+    kwargs.setdefault('stdstats', False)
+    return bt.Cerebro(**kwargs)
+
+
 class NNFX(bt.Strategy):
     params = dict(
         base_ind='butter',
@@ -31,6 +197,11 @@ class NNFX(bt.Strategy):
         leverage=20,
         oneplot=False,
         verbose=False,
+        cache_dir=None,
+        profile=False,
+        account_currency='USD',
+        trade_pairs=None,
+        journal=None,
     )
 
     def log(self, txt, dt=None):
@@ -40,63 +211,103 @@ class NNFX(bt.Strategy):
 
     def __init__(self):
         """Initialization"""
-        self.dv = DamianiVolatmeter(self.data)
         # Strategy Declarations
         self.order = None
         self.broker.set_coc=True
-        self.accn_currency = 'USD'
+        self.accn_currency = self.p.account_currency
+
+        # Indicator Output Cache (Disabled Unless a Folder is Given)
+        self.cache = IndicatorCache(self.p.cache_dir) if self.p.cache_dir else None
 
         self.inds = dict()
         self.igs = dict()
         self.closes = dict()
         self.open_orders = dict()
+        self.flip_trackers = dict()
         self.data_dict = dict()
-        for i, d in enumerate(self.datas):
+        # Feeds Traded On - the Others Only Supply Exchange Rates
+        self.traded = [d for d in self.datas if self.p.trade_pairs is None or d._name in self.p.trade_pairs]
+        for d in self.datas:
             # Data Dictionary
             self.data_dict[d._name] = d
+            # Closes
+            self.closes[d] = d.close
+        for i, d in enumerate(self.traded):
             # Open Orders
             self.open_orders[d] = {
             'sl': [],
             'tp': [],
             'tracker':[]
             }
-            # Closes
-            self.closes[d] = d.close
-            # Binary Generator
-            self.igs[d] = BG.IndicatorGenerator(d)
-            self.inds[d] = dict()
-            # Money Management Indicators
-            self.inds[d]['atr'] = bt.indicators.ATR(d,period=self.p.atr_period, plot=False)
-            # Generate Strategy Binary Indicators
-            self.inds[d]['baseline'], self.inds[d]['too_far'] = self.igs[d].baseline_indicator(self.p.base_ind, self.p.base_params, plot=False)
-            self.inds[d]['c1'] = self.igs[d].entry_indicator(self.p.c1_ind, self.p.c1_params, plot=False)
-            self.inds[d]['c2'] = self.igs[d].entry_indicator(self.p.c2_ind, self.p.c2_params, plot=False)
-            self.inds[d]['volume'] = self.igs[d].volume_indicator(self.p.volume_ind, self.p.volume_params, plot=False)
-            self.inds[d]['exit'] = self.igs[d].exit_indicator(self.p.exit_ind, self.p.exit_params, plot=False)
+            # Baseline Cross and C1 Flip History
+            self.flip_trackers[d] = FlipTracker()
+            if 'c1_sig' in d.lines.getlinealiases():
+                # Signals Precomputed and Attached to the Feed (see signals.py)
+                self.inds[d] = {name: getattr(d.lines, name + '_sig') for name in SIGNALS}
+            else:
+                # Binary Generator
+                self.igs[d] = BG.IndicatorGenerator(d, cache=self.cache)
+                self.inds[d] = build_signals(self.igs[d], self.p)
 
             if i > 0:  # Check we are not on the first loop of data feed:
                 if self.p.oneplot == True:
-                    d.plotinfo.plotmaster = self.datas[0]
-
-        # Set Commission and Determine which pairs need live exchange rates
-        self.manual_commission_pairs = []
-        for key in list(self.data_dict.keys()):
-            base = key[0:3]
-            counter = key[3:]
-            JPY = True if 'JPY' in [base, counter] else False
-            if counter == self.accn_currency:
+                    d.plotinfo.plotmaster = self.traded[0]
+
+        # Pip Size, Method and Path to the Account Currency of Every Pair
+        self.conversions = build_conversions(list(self.data_dict.keys()), self.accn_currency)
+        self.conversion_legs = dict()
+        for key, conversion in self.conversions.items():
+            legs = conversion['legs']
+            if legs is not None:
+                legs = tuple((self.closes[self.data_dict[pair]], power) for pair, power in legs)
+            self.conversion_legs[self.data_dict[key]] = legs
+
+        # Set Commission Once per Pair - Pairs Quoted Outside the Account Currency
+        # Read their Exchange Rate off the Conversion Feeds When the Broker Fills
+        for key, conversion in self.conversions.items():
+            JPY = conversion['pip'] == 0.01
+            if conversion['method'] == 0:
                 # Set Commission for Pairs where Counter and Account Currency are the Same
                 comminfo = forexSpreadCommisionScheme(spread=2,method=0,JPY_pair=JPY,leverage=self.p.leverage)
                 self.broker.addcommissioninfo(comminfo,name=key)
-            elif base == self.accn_currency:
+            elif conversion['legs'] is not None:
+                comminfo = forexLiveRateCommisionScheme(spread=2,
+                                                        method=conversion['method'],
+                                                        JPY_pair=JPY,
+                                                        legs=self.conversion_legs[self.data_dict[key]],
+                                                        leverage=self.p.leverage)
+                self.broker.addcommissioninfo(comminfo,name=key)
 
-                self.manual_commission_pairs.append(key)
+        # Event Journal (Disabled Unless a File is Given)
+        self.journal = Journal(self.p.journal) if self.p.journal else None
+
+        # Timing Counters (Only Installed When Profiling)
+        self.profiler = None
+        if self.p.profile:
+            self.profiler = Profiler()
+            self.profiler.watch_strategy(self, PROFILED_METHODS)
+
+    def qbuffer(self, savemem=0, replaying=False):
+        super(NNFX, self).qbuffer(savemem=savemem, replaying=replaying)
+        # Bounded buffers are sized to the minimum period of each series - widen
+        # the ones the trading logic looks further back on
+        for d in self.traded:
+            for name, size in LOOKBACK.items():
+                self.inds[d][name].lines[0].minbuffer(size)
+
+    def stop(self):
+        # Store Freshly Computed Indicator Outputs
+        if self.cache is not None:
+            for ig in self.igs.values():
+                ig.save_cache()
+        if self.journal is not None:
+            self.journal.close()
 
     def refresh_conditions(self):
         self.trade_conditons = dict()
         self.trade_conditons[1.0] = dict()
         self.trade_conditons[-1.0] = dict()
-        for i, d in enumerate(self.datas):
+        for i, d in enumerate(self.traded):
             self.trade_conditons[1.0][d] = {
                 'baseline': self.inds[d]['baseline'] > 0,
                 'c1': self.inds[d]['c1'] > 0,
@@ -125,7 +336,7 @@ class NNFX(bt.Strategy):
     def clean_orders(self):
 
         # Clean Open Orders Dictionary
-        for i, d in enumerate(self.datas):
+        for i, d in enumerate(self.traded):
             for o in self.open_orders[d]['sl']:
                 if not o.alive():
                     self.open_orders[d]['tracker'].remove(o.ref)
@@ -136,13 +347,15 @@ class NNFX(bt.Strategy):
 
     def check_positions(self):
         self.position_dict = dict()
-        for i, d in enumerate(self.datas):
+        for i, d in enumerate(self.traded):
             self.position_dict[d._name] = self.getposition(d).size
 
     def notify_order(self, order):
 
         # Call Custom Notification Function to Keep Code Clean
         dt, dn = self.datetime.date(), order.data._name
+        if self.journal is not None:
+            self.journal.order(order)
         res = notifier(order, dt, self.open_orders[order.data]['tracker'],verbose=self.p.verbose)
         # Take Profit Hit, Initialize Trailing Stop Order
         if res:
@@ -165,42 +378,27 @@ class NNFX(bt.Strategy):
 
         # Call Custom Notification Function to Keep Code Clean
         date = self.data.datetime.datetime().date()
+        if self.journal is not None:
+            self.journal.trade(trade)
         notifier(trade, date,[],verbose=self.p.verbose)
 
-    def size_position(self, d, stop_amount, risk):
-        pair = d._name
-        base = pair[0:3]
-        counter = pair[3:]
-
-        if counter == self.accn_currency:
-            method = 0
-        elif base == self.accn_currency:
-            method = 1
-        elif self.accn_currency not in [base, counter]:
-            method = 2
-            exchange_pair = self.accn_currency+counter
-
-            # Check if Exchange Pair Exists
-            if exchange_pair in list(self.data_dict.keys()):
-                exchange_rate = self.closes[self.data_dict[exchange_pair]][0]
-            # Check if Reverse of Exchange Pair Exists
-            elif counter+self.accn_currency in list(self.data_dict.keys()):
-                exchange_rate = self.closes[self.data_dict[counter+self.accn_currency]][0]
-                exchange_rate = 1/exchange_rate
+    def conversion_rate(self, d):
+        """
+        Counter currency of a pair bought by one unit of the account currency, at the current bar
+        """
+        legs = self.conversion_legs[d]
+        if legs is None:
+            raise ValueError('No feed converts {} into {}'.format(d._name[3:], self.accn_currency))
+        rate = 1.0
+        for close, power in legs:
+            rate = rate*close[0] if power > 0 else rate/close[0]
+        return rate
 
+    def size_position(self, d, stop_amount, risk):
         price = self.closes[d][0]
         stop = price - stop_amount
         risk = float(risk) / 100.0
-
-        if base == 'JPY' or counter == 'JPY':
-            JPY_pair = True
-        else:
-            JPY_pair = False
-
-        if JPY_pair == True:  # check if a YEN cross and change the multiplier
-            multiplier = 0.01
-        else:
-            multiplier = 0.0001
+        multiplier = self.conversions[d._name]['pip']
 
         # Calc how much to risk
         acc_value = self.broker.getvalue()
@@ -208,57 +406,21 @@ class NNFX(bt.Strategy):
         stop_pips_int = abs((price - stop) / multiplier)
         pip_value = cash_risk / stop_pips_int
 
-        if method == 1:
-            pip_value = pip_value * price
-            units = pip_value / multiplier
-            return units
-
-        elif method == 2:
-            pip_value = pip_value * exchange_rate
-            units = pip_value / multiplier
-            return units
-
-        else:  # is method 0
-            units = pip_value / multiplier
-            return units
-
-    def set_commission(self, d):
-        # Split Pair into Counter/Base Components
-        pair = d._name
-        base = pair[:3]
-        counter = pair[3:]
-
-        # Determine if JPY is in the Pair
-        JPY = True if 'JPY' in [base, counter] else False
-
-        # Case 1: USDXXX
-        if base == self.accn_currency:
-            currency_conversion = 1/self.closes[d][0]
-            comminfo = forexSpreadCommisionScheme(spread=2,
-                                                  method=1,
-                                                  JPY_pair=JPY,
-                                                  mult=currency_conversion,
-                                                  leverage=self.p.leverage)
-
-        # Case 2: XXXYYY
-        else:
-            # Look for USDYYY
-            forward = self.accn_currency+counter
-            # Look for YYYUSD
-            reverse = counter+self.accn_currency
-            if forward in list(self.data_dict.keys()):
-                exchange_rate=self.closes[self.data_dict[forward]][0]
-            elif reverse in list(self.data_dict.keys()):
-                exchange_rate=1.0/self.cloases[self.data_dict[reverse]][0]
-            currency_conversion = 1.0/exchange_rate
-
-            comminfo = forexSpreadCommisionScheme(spread=2,
-                                                  method=2,
-                                                  JPY_pair=JPY,
-                                                  exchange_rate=exchange_rate,
-                                                  mult=currency_conversion,
-                                                  leverage=self.p.leverage)
-        self.broker.addcommissioninfo(comminfo, name=d._name)
+        # Pip Value in the Counter Currency
+        pip_value = pip_value * self.conversion_rate(d)
+        units = pip_value / multiplier
+        return units
+
+    def update_flips(self):
+        # Baseline Cross and C1 Flip History - on the First Bar the Trackers Catch up on the
+        # Bars the Rules Look Back on, after that Every Bar Costs a Single Update
+        for d in self.traded:
+            tracker = self.flip_trackers[d]
+            baseline, c1 = self.inds[d]['baseline'], self.inds[d]['c1']
+            if not tracker.bars:
+                for ago in range(min(LOOKBACK['baseline'], len(d)) - 1, 0, -1):
+                    tracker.update(baseline[-ago], c1[-ago])
+            tracker.update(baseline[0], c1[0])
 
     def pullback(self,d):
 
@@ -266,67 +428,55 @@ class NNFX(bt.Strategy):
         if self.inds[d]['baseline'] != 0.0 and self.inds[d]['too_far'][0]:
             # Too far from baseline - no trading should occur
             if self.p.verbose: print('CAUTION BASELINE CROSS TOO FAR - CHECKING FOR PULLBACK')
+            if self.journal is not None: self.journal.decision(d, 'too_far')
             self.trade_conditons[self.inds[d]['baseline'][0]][d]['baseline'] = False
         elif self.inds[d]['baseline'][-1] != 0.0 and self.inds[d]['too_far'][-1] and not self.inds[d]['too_far'][0]:
             # Previous Candle was a Baseline Cross more than 1xATR
             # We are currently not "too far" from the baseline
             if self.p.verbose: print('PULLBACK DETECTED - BASELINE SAYS GO')
+            if self.journal is not None: self.journal.decision(d, 'pullback')
             self.trade_conditons[1.0][d]['baseline'] = self.inds[d]['baseline'][-1]>0
             self.trade_conditons[-1.0][d]['baseline'] = self.inds[d]['baseline'][-1]<0
 
     def continuation(self,d):
 
         # This is Where We Check the Logic for Continuation Trades
+        tracker = self.flip_trackers[d]
 
-        # Get last fifty bars of baseline flip data
-        base_hist = list(self.inds[d]['baseline'].get(size=30))
-        base_hist.reverse()
-
-        # Iterate through base flip history and get index of last flip:
-        idx = next((i for i, x in enumerate(base_hist) if x != 0.0), None)
-
-        if not idx:
+        # Baseline Must Have Flipped Within the Last 30 Bars (but not on this one)
+        if not 0 < tracker.since_cross < LOOKBACK['baseline']:
             return None
 
-        base = base_hist[idx]
-
-        # Get Confirmation indicator Data since last baseline flip:
-        c1_hist = list(self.inds[d]['c1'].get(size=idx))
-        c1_hist.reverse()
+        base = tracker.cross
 
-        # Check if a confirmation flip has been detected
-        if -1.0 * base in c1_hist:
-            flips = len(list(itertools.groupby(c1_hist, lambda c1_hist: c1_hist > 0))) - 1
+        # Check if a confirmation flip has been detected since the baseline flip
+        if tracker.c1_since(-1.0 * base) < tracker.since_cross:
             # Check if we have a double confirmation flip
-            if flips == 2:
+            if tracker.flips == 2:
                 # Continuation Opportunity Detected!
                 # Double Check Confirmation Indicator 2
-                if self.inds[d]['c2'][0] == c1_hist[0]:
+                if self.inds[d]['c2'][0] == self.inds[d]['c1'][0]:
                     if self.p.verbose: print('CONTINUATION TRADE DETECTED')
+                    if self.journal is not None: self.journal.decision(d, 'continuation')
                     # Update the Corresponding Buy/Sell Conditions
                     for key in self.trade_conditons[self.inds[d]['c1'][0]][d]:
                         self.trade_conditons[self.inds[d]['c1'][0]][d][key] = True
 
     def bridge_too_far(self,d):
 
-        # Determine how long ago last flip in C1 Occurred
-
-        c1_hist = list(self.inds[d]['c1'].get(size=10))
-        c1_hist.reverse()
-
-        try:
-            idx = c1_hist.index(-1.0 * self.inds[d]['baseline']) - 1
-        except:
-            idx = 100
+        # Determine how long ago C1 last went against the baseline cross
+        bars = self.flip_trackers[d].c1_since(-1.0 * self.inds[d]['baseline'][0])
 
         trade = self.decide_trade(d)
-        if idx > 7 and trade != 0.0:
+        if bars >= BRIDGE_TOO_FAR and trade != 0.0:
             if self.p.verbose: print('BRIDGE TOO FAR, DO NOT TRADE')
+            if self.journal is not None: self.journal.decision(d, 'bridge_too_far')
             self.trade_conditons[trade][d]['c1'] = False
 
     def next(self):
         # Make Sure we have the most recent trading conditions:
         self.refresh_conditions()
+        self.update_flips()
         self.clean_orders()
         self.check_positions()
 
@@ -334,7 +484,7 @@ class NNFX(bt.Strategy):
         if self.p.verbose: self.log('Current Closing Price: %.5f' % self.dataclose[0])
 
         # Check if We have a Pending Order and Exit Function to Avoid Creating Duplicate
-        for i, d in enumerate(self.datas):
+        for i, d in enumerate(self.traded):
             if len(self.open_orders[d]['sl']) > 0 or len(self.open_orders[d]['tp']) > 0:
                 continue
 
@@ -357,10 +507,6 @@ class NNFX(bt.Strategy):
                     # Enter Long Position
                     # Calculate Risk Profile
 
-                    if d._name in self.manual_commission_pairs:
-                        #Set Commission for Cross Pair
-                        self.set_commission(d)
-
                     size = round(self.size_position(d, self.p.sl * self.inds[d]['atr'], self.p.risk)/2)
                     price = self.closes[d]
                     tp = price + self.p.tp * self.inds[d]['atr']
@@ -388,15 +534,12 @@ class NNFX(bt.Strategy):
                     self.open_orders[d]['sl'].append(stop_loss)
                     self.open_orders[d]['tp'].append(take_profit)
                     self.open_orders[d]['tracker'].append(stop_loss.ref)
+                    if self.journal is not None: self.journal.decision(d, 'enter', 2*size, price[0])
 
                 elif self.decide_trade(d) < 0.0:
                     # Enter Long Position
                     # Calculate Risk Profile
 
-                    if d._name in self.manual_commission_pairs:
-                        #Set Commission for Cross Pair
-                        self.set_commission(d)
-
                     size = round(self.size_position(d, self.p.sl * self.inds[d]['atr'], self.p.risk)/2)
                     price = self.closes[d]
                     tp = price - self.p.tp * self.inds[d]['atr']
@@ -424,6 +567,7 @@ class NNFX(bt.Strategy):
                     self.open_orders[d]['sl'].append(stop_loss)
                     self.open_orders[d]['tp'].append(take_profit)
                     self.open_orders[d]['tracker'].append(stop_loss.ref)
+                    if self.journal is not None: self.journal.decision(d, 'enter', -2*size, price[0])
 
             else:
 
@@ -434,11 +578,13 @@ class NNFX(bt.Strategy):
                     # Check for Sell Exit Signal
                     if any(sellexit_conds):
                         self.order = self.close(data=d)
+                        if self.journal is not None: self.journal.decision(d, 'exit', -pos, self.closes[d][0])
 
                 elif pos < 0:
                     # Check for Buy Exit Signal
                     if any(buyexit_conds):
                         self.order = self.close(data=d)
+                        if self.journal is not None: self.journal.decision(d, 'exit', -pos, self.closes[d][0])
 
 
 if __name__ == '__main__':
@@ -466,9 +612,7 @@ if __name__ == '__main__':
     # Create a Data Feeds and Add to Cerebro
 
     for i in range(len(datasets)):
-        data = bt.feeds.GenericCSVData(dataname=datasets[i][0],
-                                   openinterest=-1,
-                                   dtformat='%d.%m.%Y %H:%M:%S.000')
+        data = ColumnarData(dataname=datasets[i][0])
         cerebro.adddata(data, name=datasets[i][1])
 
     # Set our desired cash start
@@ -0,0 +1,234 @@
+import backtrader as bt
+from custom_functions import *
+from nnfx import NNFX, lean_cerebro, build_conversions
+from sweep import summarize
+from shareddata import SharedFeeds, attach_feeds
+import numpy as np
+import multiprocessing
+import time
+
+# Independent Per-Pair Backtests Merged into a Portfolio
+#
+# For single-pair research every pair is backtested on its own, in its own
+# cerebro, on a pool of worker processes. A cross also gets the feeds of its
+# conversion path to the account currency, which only supply exchange rates
+# (see the trade_pairs param of NNFX). The trade lists, daily equity curves,
+# TradeAnalyzer and SQN results of the pairs are then merged into a single
+# portfolio report. Capital is either a fixed stake per pair or a total split
+# across the pairs in proportion to their weights.
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def conversion_feeds(pair, names, account='USD'):
+    """
+    Feeds a single-pair run needs: the pair itself followed by the pairs on its
+    conversion path to the account currency (see nnfx.build_conversions)
+    """
+    legs = build_conversions(list(names), account)[pair]['legs'] or ()
+    needed = [pair]
+    for name, power in legs:
+        if name not in needed:
+            needed.append(name)
+    return needed
+
+
+def allocate(pairs, cash=1000.0, allocation='fixed', weights=None):
+    """
+    Starting cash of every pair
+    :param pairs: List of pair names
+    :param cash: Stake per pair ('fixed') or total capital ('proportional')
+    :param allocation: 'fixed' or 'proportional'
+    :param weights: Dict of pair name -> weight for 'proportional' (default equal weights)
+    :return: Dict of pair name -> cash
+
+    """
+    if allocation == 'fixed':
+        return {pair: cash for pair in pairs}
+    if allocation != 'proportional':
+        raise ValueError('Unknown allocation: {}'.format(allocation))
+    weights = {pair: (weights or {}).get(pair, 0.0 if weights else 1.0) for pair in pairs}
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError('Allocation weights have to add up to more than zero')
+    return {pair: cash * w / total for pair, w in weights.items()}
+
+
+def run_pair(pair, config, feeds, cash=1000.0, lean=False):
+    """
+    Backtests NNFX on a single pair
+    :param pair: Pair name to trade
+    :param config: NNFX params dict
+    :param feeds: Dict of pair name -> columns holding the pair and its conversion feeds
+    :param cash: Starting cash
+    :param lean: Bounded-memory run (see nnfx.lean_cerebro)
+    :return: Compact result record (see sweep.summarize) plus the TradeAnalyzer figures the
+             portfolio report merges under 'ta', the closed trades as (dtopen, dtclose, long,
+             pnlcomm) tuples under 'trade_list' and the daily returns under 'dates' and 'returns'
+
+    """
+    cerebro = lean_cerebro() if lean else bt.Cerebro(stdstats=False)
+    cerebro.broker = bt.brokers.BackBroker(slip_perc=0.0001, slip_open=True)
+    cerebro.addstrategy(NNFX, trade_pairs=[pair], **config)
+    account = config.get('account_currency', NNFX.params.account_currency)
+    for name in conversion_feeds(pair, feeds.keys(), account):
+        cerebro.adddata(ArrayData(dataname=feeds[name]), name=name)
+    cerebro.broker.setcash(cash)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
+    cerebro.addanalyzer(bt.analyzers.SQN, _name="sqn")
+    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name="returns", timeframe=bt.TimeFrame.Days)
+    cerebro.addanalyzer(TradeList, _name="trades")
+
+    strategy = cerebro.run()[0]
+    record = summarize(strategy, cerebro.broker)
+
+    # Plain Values Only - Analyzer Results do not Travel Well Between Processes
+    ta = strategy.analyzers.ta.get_analysis()
+    record['ta'] = dict(
+        open=ta.get('total', {}).get('open', 0),
+        pnl_gross=ta.get('pnl', {}).get('gross', {}).get('total', 0.0),
+        won_pnl=ta.get('won', {}).get('pnl', {}).get('total', 0.0),
+        lost_pnl=ta.get('lost', {}).get('pnl', {}).get('total', 0.0),
+        long=ta.get('long', {}).get('total', 0),
+        short=ta.get('short', {}).get('total', 0),
+    )
+    record['trade_list'] = list(strategy.analyzers.trades.get_analysis())
+    returns = strategy.analyzers.returns.get_analysis()
+    record['dates'] = [bt.date2num(dt) for dt in returns.keys()]
+    record['returns'] = list(returns.values())
+    return record
+
+
+def _init_worker(spec):
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _run_job(job):
+    pair, config, cash, lean = job
+    record = dict(pair=pair, cash=cash, error=None)
+    t0 = time.time()
+    try:
+        record.update(run_pair(pair, config, _worker_feeds, cash, lean))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['time'] = time.time() - t0
+    return record
+
+
+def merge(records):
+    """
+    Merges per-pair results into a portfolio report
+    :param records: Result records of run_pair (records with an error are left out of the totals)
+    :return: Dict with the per-pair records under 'pairs', every closed trade in order of
+             closing under 'trades' (pair, dtopen, dtclose, long, pnlcomm), the summed daily
+             equity under 'dates' and 'equity', a TradeAnalyzer-style result under 'ta'
+             (works with printTradeAnalysis), an SQN-style result under 'sqn' and the
+             starting and final value of the portfolio
+
+    """
+    done = [r for r in records if not r['error']]
+
+    trades = sorted(((r['pair'],) + tuple(t) for r in done for t in r['trade_list']), key=lambda t: (t[2], t[1]))
+    pnl = np.array([t[4] for t in trades])
+
+    # Equity: Every Pair Holds its Last Value (its Starting Cash Before its First Day)
+    dates = np.unique(np.concatenate([r['dates'] for r in done])) if done else np.empty(0)
+    equity = np.zeros(len(dates))
+    for r in done:
+        curve = r['cash'] * np.cumprod(np.concatenate(([1.0], 1.0 + np.array(r['returns']))))
+        equity += curve[np.searchsorted(r['dates'], dates, side='right')]
+
+    # Trade Analysis Over the Merged Trade List
+    ta = bt.AutoOrderedDict()
+    ta.total.closed = len(trades)
+    ta.total.open = sum(r['ta']['open'] for r in done)
+    ta.total.total = ta.total.closed + ta.total.open
+    ta.won.total = int((pnl >= 0.0).sum())
+    ta.lost.total = int((pnl < 0.0).sum())
+    ta.won.pnl.total = sum(r['ta']['won_pnl'] for r in done)
+    ta.lost.pnl.total = sum(r['ta']['lost_pnl'] for r in done)
+    ta.pnl.gross.total = sum(r['ta']['pnl_gross'] for r in done)
+    ta.pnl.net.total = float(pnl.sum())
+    ta.pnl.net.average = float(pnl.mean()) if len(pnl) else 0.0
+    ta.long.total = sum(r['ta']['long'] for r in done)
+    ta.short.total = sum(r['ta']['short'] for r in done)
+    streaks = dict(won=0, lost=0)
+    run, last = 0, None
+    for won in pnl >= 0.0:
+        run = run + 1 if won == last else 1
+        last = won
+        key = 'won' if won else 'lost'
+        streaks[key] = max(streaks[key], run)
+    ta.streak.won.longest = streaks['won']
+    ta.streak.lost.longest = streaks['lost']
+
+    # SQN as backtrader Computes it (Population Standard Deviation)
+    sqn = bt.AutoOrderedDict()
+    sqn.trades = len(pnl)
+    sqn.sqn = 0
+    if len(pnl) > 1:
+        sqn.sqn = float(np.sqrt(len(pnl)) * pnl.mean() / pnl.std()) if pnl.std() > 0 else None
+
+    start = sum(r['cash'] for r in done)
+    return dict(
+        pairs=records,
+        trades=trades,
+        dates=dates,
+        equity=equity,
+        ta=ta,
+        sqn=sqn,
+        start_value=start,
+        final_value=sum(r['final_value'] for r in done),
+    )
+
+
+def portfolio_backtest(config, pairs=None, dpath='Data/', cash=1000.0, allocation='fixed', weights=None,
+                       processes=None, lean=False):
+    """
+    Backtests every pair independently across a pool of worker processes and merges the results
+    :param config: NNFX params dict
+    :param pairs: List of pair names to trade (default all files in dpath)
+    :param dpath: Data folder
+    :param cash: Stake per pair ('fixed') or total capital split across the pairs ('proportional')
+    :param allocation: 'fixed' or 'proportional' (see allocate)
+    :param weights: Dict of pair name -> weight for 'proportional' allocation
+    :param processes: Number of workers (default cpu count)
+    :param lean: Bounded-memory runs (see nnfx.lean_cerebro)
+    :return: Portfolio report (see merge)
+
+    """
+    names = sorted(file_browser(dpath)[1])
+    pairs = list(pairs) if pairs is not None else names
+    stakes = allocate(pairs, cash, allocation, weights)
+
+    # Every Worker Maps the Traded Pairs and Whatever Converts Them
+    account = config.get('account_currency', NNFX.params.account_currency)
+    needed = []
+    for pair in pairs:
+        needed.extend(name for name in conversion_feeds(pair, names, account) if name not in needed)
+
+    jobs = [(pair, config, stakes[pair], lean) for pair in pairs]
+    with SharedFeeds(needed, dpath) as shared, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        records = list(pool.imap_unordered(_run_job, jobs))
+
+    records.sort(key=lambda r: pairs.index(r['pair']))
+    return merge(records)
+
+
+if __name__ == '__main__':
+
+    t0 = time.time()
+    portfolio = portfolio_backtest(dict(), allocation='proportional', cash=24000.0)
+    t1 = time.time()
+
+    for r in portfolio['pairs']:
+        print('{} {}'.format(r['pair'], 'ERROR: '+r['error'] if r['error'] else
+                             'Final Value: %.2f Trades: %d SQN: %.2f (%.1fs)' % (r['final_value'], r['trades'],
+                                                                                  r['sqn'] or 0.0, r['time'])))
+    print('Portfolio Value: %.2f -> %.2f' % (portfolio['start_value'], portfolio['final_value']))
+    printTradeAnalysis(portfolio['ta'])
+    printSQN(portfolio['sqn'])
+    print('Portfolio Time: %.2fs for %d pairs' % (t1-t0, len(portfolio['pairs'])))
@@ -0,0 +1,142 @@
+import backtrader as bt
+from custom_functions import *
+import collections
+import time
+import os
+
+# Opt-In Hot-Path Profiling
+#
+# A Profiler swaps timed wrappers in for the methods it is asked to watch,
+# on the instances only, so nothing changes (and nothing is paid) unless a
+# run is instrumented. Every call is counted with its inclusive time, and its
+# self time is booked against the stack of watched calls it ran under, which
+# gives the collapsed-stack format flamegraph tools read.
+
+
+class Profiler(object):
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        Collects call counts and wall time of wrapped methods
+        :param clock: Timer returning seconds
+
+        """
+        self.clock = clock
+        # Name -> [calls, inclusive seconds, self seconds]
+        self.stats = collections.defaultdict(lambda: [0, 0.0, 0.0])
+        # Collapsed stack (names joined by ;) -> self seconds
+        self.stacks = collections.defaultdict(float)
+        # Open calls as [stack, start, time spent in watched children]
+        self._open = []
+
+    def wrap(self, name, func):
+        """
+        Timed stand-in for func, booked under name
+        """
+        clock, stats, stacks, stack_open = self.clock, self.stats, self.stacks, self._open
+
+        def timed(*args, **kwargs):
+            parent = stack_open[-1] if stack_open else None
+            frame = [parent[0] + ';' + name if parent else name, clock(), 0.0]
+            stack_open.append(frame)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - frame[1]
+                stack_open.pop()
+                own = elapsed - frame[2]
+                if parent:
+                    parent[2] += elapsed
+                entry = stats[name]
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] += own
+                stacks[frame[0]] += own
+
+        timed.__wrapped__ = func
+        return timed
+
+    def watch(self, obj, methods, label=None):
+        """
+        Wraps methods of a single object (instance attributes, the class is left alone)
+        :param obj: Object to instrument
+        :param methods: Method names, or dict of method name -> name shown in the report
+        :param label: Prefix of the report names (default the class name)
+
+        """
+        label = label or type(obj).__name__
+        if not isinstance(methods, dict):
+            methods = {m: m for m in methods}
+        for method, shown in methods.items():
+            func = getattr(obj, method, None)
+            if func is not None and not hasattr(func, '__wrapped__'):
+                setattr(obj, method, self.wrap(label + '.' + shown, func))
+
+    def watch_indicators(self, owner):
+        """
+        Wraps the per-bar (next) and batch (once) updates of every indicator and line
+        operation below owner. Each update includes those of its own sub-indicators.
+        """
+        # Line operations (e.g. bt.If) have no children of their own
+        children = getattr(owner, '_lineiterators', None)
+        for ind in children[bt.LineIterator.IndType] if children else ():
+            self.watch(ind, {'_next': 'next', '_once': 'once'})
+            self.watch_indicators(ind)
+
+    def watch_strategy(self, strategy, methods=()):
+        """
+        Instruments a strategy: its indicators, next and the given methods
+        """
+        self.watch_indicators(strategy)
+        self.watch(strategy, ('next',) + tuple(methods))
+
+    def table(self, top=None):
+        """
+        Report of the watched calls, slowest (by self time) first
+        """
+        rows = sorted(self.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        total = sum(s[2] for s in self.stats.values()) or 1.0
+        out = ['{:<44}{:>10}{:>12}{:>12}{:>8}{:>15}'.format('Call', 'Calls', 'Total (s)', 'Self (s)', 'Self %', 'Per Call (us)')]
+        for name, (calls, incl, own) in rows:
+            out.append('{:<44}{:>10}{:>12.4f}{:>12.4f}{:>8.1f}{:>15.2f}'.format(
+                name, calls, incl, own, 100.0 * own / total, 1e6 * incl / calls))
+        return '\n'.join(out)
+
+    def collapsed(self):
+        """
+        Self time per call stack in collapsed format (one 'a;b;c microseconds' line per stack)
+        """
+        return '\n'.join('{} {}'.format(stack, int(round(seconds * 1e6)))
+                         for stack, seconds in sorted(self.stacks.items()))
+
+    def write_collapsed(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self.collapsed() + '\n')
+
+
+if __name__ == '__main__':
+    from nnfx import NNFX
+    from datacache import ColumnarData
+
+    paths, names = file_browser()
+    files = dict(zip(names, paths))
+
+    for runonce in (True, False):
+        cerebro = bt.Cerebro(stdstats=False, runonce=runonce)
+        cerebro.broker = bt.brokers.BackBroker(slip_perc=0.0001, slip_open=True)
+        cerebro.addstrategy(NNFX, profile=True)
+        for name in ['EURUSD', 'USDJPY', 'EURJPY']:
+            cerebro.adddata(ColumnarData(dataname='Data/'+files[name]), name=name)
+        cerebro.broker.setcash(1000.0)
+
+        t0 = time.time()
+        strat = cerebro.run()[0]
+        t1 = time.time()
+
+        mode = 'runonce' if runonce else 'runnext'
+        print('{} - Backtest Time: {:.2f}s'.format(mode, t1-t0))
+        print(strat.profiler.table(top=25))
+        strat.profiler.write_collapsed('Data/bench/nnfx_{}.folded'.format(mode))
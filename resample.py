@@ -0,0 +1,315 @@
+import backtrader as bt
+from custom_functions import *
+from datacache import COLUMNS, cache_paths, cache_is_valid, file_checksum, write_table
+import numpy as np
+import tracemalloc
+import argparse
+import datetime
+import time
+import os
+
+# Streaming Ingestion of Dukascopy Minute and Tick Exports
+#
+# Minute and tick exports come in the same "Gmt time,Open,High,Low,Close,Volume"
+# layout as the daily files but run to several GB, so they are read in blocks
+# of raw bytes and never held in full. Each block is parsed with array
+# operations - the timestamp has a fixed width, so its digits sit at fixed
+# offsets from the start of every line, and the prices are read digit by digit
+# across all fields at once - and folded into bars of every
+# requested timeframe in the same pass. A bar still open at the end of a block
+# is carried over into the next one. The bars end up in the columnar cache
+# (see datacache.py) under <pair>_<bars>.npy, next to the daily tables.
+
+# Bar Sizes in Minutes
+BARS = dict(D=1440, H4=240, H1=60)
+
+# Backtrader (timeframe, compression) of Each Bar Size
+BAR_TIMEFRAMES = dict(
+    D=(bt.TimeFrame.Days, 1),
+    H4=(bt.TimeFrame.Minutes, 240),
+    H1=(bt.TimeFrame.Minutes, 60),
+)
+
+# Offsets of the Digits in "DD.MM.YYYY HH:MM:SS.mmm,"
+STAMP_WIDTH = 24
+DIGITS = dict(day=(0, 1), month=(3, 4), year=(6, 7, 8, 9), hour=(11, 12), minute=(14, 15))
+SEPARATORS = {2: b'.', 5: b'.', 10: b' ', 13: b':', 16: b':', 19: b'.', 23: b','}
+
+# date(1970, 1, 1).toordinal()
+EPOCH_ORDINAL = 719163
+
+
+def parse_rows(data):
+    """
+    Parses complete lines of an export
+    :param data: Bytes holding whole lines (each ending in a newline)
+    :return: (minutes since 1970-01-01 as int64, (rows, 5) float64 array of OHLCV)
+
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Blank lines (and stray carriage returns) carry no row
+    rows = ends - starts > STAMP_WIDTH
+    starts = starts[rows]
+
+    for offset, char in SEPARATORS.items():
+        if not np.all(buf[starts + offset] == ord(char)):
+            bad = starts[np.argmax(buf[starts + offset] != ord(char))]
+            raise ValueError('Unexpected timestamp layout: {!r}'.format(bytes(buf[bad:bad + STAMP_WIDTH])))
+
+    fields = dict()
+    for name, offsets in DIGITS.items():
+        value = np.zeros(len(starts), dtype=np.int64)
+        for offset in offsets:
+            value = 10*value + buf[starts + offset] - ord('0')
+        fields[name] = value
+
+    days = ((fields['year'] - 1970).astype('M8[Y]').astype('M8[M]') + (fields['month'] - 1)).astype('M8[D]') \
+        + (fields['day'] - 1)
+    minutes = days.astype(np.int64)*1440 + fields['hour']*60 + fields['minute']
+
+    # Every row holds 5 values after the timestamp, so its commas come in fives
+    commas = np.flatnonzero(buf == ord(','))
+    if commas.size != 5*len(starts) or not np.array_equal(commas[::5], starts + STAMP_WIDTH - 1):
+        raise ValueError('Expected 5 values per row')
+    commas = commas.reshape(-1, 5)
+    line_ends = ends[rows] - (buf[ends[rows] - 1] == ord('\r'))
+    first = (commas + 1).ravel()
+    width = np.column_stack((commas[:, 1:], line_ends)).ravel() - first
+    return minutes, parse_decimals(buf, first, width).reshape(-1, 5)
+
+
+def parse_decimals(buf, first, width):
+    """
+    Parses plain decimal fields (digits with an optional sign and point) of a byte array
+    :param buf: uint8 array
+    :param first: Offsets of the first character of every field
+    :param width: Characters in every field
+    :return: float64 array, identical to what float() gives on each field
+
+    """
+    # Fields are read as an integer of all their digits over a power of ten, one
+    # character position at a time. Both are exact below 2**53, so the division
+    # is correctly rounded, just like float(). Anything else (exponents, very
+    # long fields) is left to float().
+    digits = np.zeros(len(first), dtype=np.int64)
+    point = width.copy()
+    points = np.zeros(len(first), dtype=np.int8)
+    negative = buf[first] == ord('-')
+    unusual = (width == 0) | (width > 17)
+    for k in range(min(int(width.max(initial=0)), 18)):
+        inside = k < width
+        char = buf.take(first + k, mode='clip')
+        digit = char - np.uint8(ord('0'))
+        is_digit = digit < 10
+        is_digit &= inside
+        is_point = char == ord('.')
+        is_point &= inside
+        np.multiply(digits, 10, out=digits, where=is_digit)
+        np.add(digits, digit, out=digits, where=is_digit)
+        point[is_point] = k
+        points += is_point
+        is_digit |= is_point
+        if k == 0:
+            is_digit |= negative
+        unusual |= inside > is_digit
+    unusual |= (points > 1) | (width - (point < width) - negative > 15)
+
+    decimals = np.where(point < width, width - point - 1, 0)
+    values = digits / 10.0**decimals
+    values[negative] *= -1.0
+    for i in np.flatnonzero(unusual):
+        values[i] = float(buf[first[i]:first[i] + width[i]].tobytes())
+    return values
+
+
+def read_chunks(path, chunk_bytes=16 << 20):
+    """
+    Streams an export in blocks of whole lines
+    :param path: Path to the CSV
+    :param chunk_bytes: Bytes read at a time (bounds the memory used)
+    :return: Generator of parsed blocks (see parse_rows)
+
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        tail = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            tail = block[cut:]
+            if cut:
+                yield parse_rows(block[:cut])
+        if tail.strip():
+            yield parse_rows(tail + b'\n')
+
+
+def bar_stamps(ends, minutes):
+    """
+    Backtrader dates of bars ending at the given minutes. Daily bars are stamped
+    at the end of their session (as read_csv_columns does), intraday bars at
+    their closing minute (as the backtrader resampler does).
+    """
+    if minutes >= 1440:
+        epoch = datetime.datetime(1970, 1, 1)
+        session = datetime.time(23, 59, 59, 999990)
+        return [bt.date2num(datetime.datetime.combine((epoch + datetime.timedelta(minutes=m - 1)).date(), session))
+                for m in ends.tolist()]
+    # Intraday bars close on whole hours, where the exactly rounded sum
+    # bt.date2num takes of the day number and the hour fraction is one float addition
+    return (ends//1440 + EPOCH_ORDINAL) + (ends % 1440)/1440.0
+
+class BarFolder(object):
+    '''
+    Folds chronological blocks of rows into bars of a fixed number of minutes
+    (aligned to midnight GMT). The last bar of a block stays open, since the
+    next block may still add to it.
+    '''
+
+    def __init__(self, minutes):
+        self.minutes = minutes
+        self.bars = []
+        self.open_bar = None
+        self.last = None
+
+    def push(self, minutes, values):
+        if not len(minutes):
+            return
+        if (self.last is not None and minutes[0] < self.last) or np.any(minutes[1:] < minutes[:-1]):
+            raise ValueError('Rows are not in chronological order')
+        self.last = minutes[-1]
+
+        bucket = minutes // self.minutes
+        first = np.flatnonzero(bucket[1:] != bucket[:-1]) + 1
+        starts = np.concatenate(([0], first))
+        last = np.concatenate((first - 1, [len(bucket) - 1]))
+        bars = np.column_stack((
+            bucket[starts].astype(np.float64),
+            values[starts, 0],
+            np.maximum.reduceat(values[:, 1], starts),
+            np.minimum.reduceat(values[:, 2], starts),
+            values[last, 3],
+            np.add.reduceat(values[:, 4], starts),
+        ))
+
+        if self.open_bar is not None:
+            carried = self.open_bar
+            if carried[0] == bars[0, 0]:
+                # Still the same bar: keep its open, widen its range, add up the volume
+                bars[0, 1] = carried[1]
+                bars[0, 2] = max(bars[0, 2], carried[2])
+                bars[0, 3] = min(bars[0, 3], carried[3])
+                bars[0, 5] += carried[5]
+            else:
+                self.bars.append(carried[None, :])
+        self.bars.append(bars[:-1])
+        self.open_bar = bars[-1].copy()
+
+    def table(self):
+        """
+        Every bar folded so far (the open one included) as a (len(COLUMNS), rows) table
+        """
+        bars = self.bars + ([self.open_bar[None, :]] if self.open_bar is not None else [])
+        bars = np.concatenate(bars) if bars else np.empty((0, 6))
+        ends = (bars[:, 0].astype(np.int64) + 1)*self.minutes
+        table = bars.T.copy()
+        table[0] = bar_stamps(ends, self.minutes)
+        return table
+
+
+def resample_file(path, bars=('D', 'H4', 'H1'), cache_dir='Data/cache/', chunk_bytes=16 << 20, drop_flat=True):
+    """
+    Streams a minute or tick export once and stores it resampled to every bar size
+    :param path: Path to the CSV
+    :param bars: Bar sizes to build (keys of BARS)
+    :param cache_dir: Folder of the columnar cache
+    :param chunk_bytes: Bytes parsed at a time
+    :param drop_flat: Skip zero volume rows (Dukascopy pads closed market hours with them)
+    :return: Dict with the row count under 'rows' and the bar size -> .npy path under 'tables'
+
+    """
+    stat = os.stat(path)
+    sha1 = file_checksum(path)
+    folders = {name: BarFolder(BARS[name]) for name in bars}
+
+    rows = 0
+    for minutes, values in read_chunks(path, chunk_bytes):
+        rows += len(minutes)
+        if drop_flat:
+            traded = values[:, 4] != 0.0
+            minutes, values = minutes[traded], values[traded]
+        for folder in folders.values():
+            folder.push(minutes, values)
+
+    tables = dict()
+    for name, folder in folders.items():
+        tables[name] = write_table(path, cache_dir, folder.table(), sha1, stat, suffix='_'+name,
+                                   bars=name, source_rows=rows, drop_flat=drop_flat)
+    return dict(rows=rows, tables=tables)
+
+
+def load_resampled(path, bars='H1', cache_dir='Data/cache/', drop_flat=True):
+    """
+    Memory-maps the resampled bars of an export, (re)building them when missing or stale
+    :param path: Path to the source CSV
+    :param bars: Bar size (key of BARS)
+    :param cache_dir: Folder of the columnar cache
+    :param drop_flat: Skip zero volume rows when (re)building
+    :return: Dict of column name -> read-only array, usable as ArrayData columns
+
+    """
+    if not cache_is_valid(path, cache_dir, '_'+bars):
+        resample_file(path, (bars,), cache_dir, drop_flat=drop_flat)
+    npy, _ = cache_paths(path, cache_dir, '_'+bars)
+    table = np.load(npy, mmap_mode='r')
+    return dict(zip(COLUMNS, table))
+
+
+class ResampledData(ArrayData):
+    '''
+    Data feed over the resampled bars of a minute or tick export. Pass the CSV
+    path as dataname and the bar size as bars - timeframe and compression are
+    set to match.
+    '''
+
+    params = (
+        ('bars', 'H1'),
+        ('cache_dir', 'Data/cache/'),
+    )
+
+    def __init__(self):
+        self.p.timeframe, self.p.compression = BAR_TIMEFRAMES[self.p.bars]
+
+    def _columns(self):
+        return load_resampled(self.p.dataname, self.p.bars, self.p.cache_dir)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Resample Dukascopy minute/tick exports into the columnar cache')
+    parser.add_argument('paths', nargs='+', help='Export CSVs')
+    parser.add_argument('--bars', nargs='*', default=['D', 'H4', 'H1'], choices=sorted(BARS), help='Bar sizes')
+    parser.add_argument('--chunk-mb', type=int, default=16, help='Block size read at a time (MB)')
+    parser.add_argument('--keep-flat', action='store_true', help='Keep zero volume rows')
+    parser.add_argument('--memory', action='store_true', help='Trace the peak Python memory (slows the run down)')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if args.memory:
+            tracemalloc.start()
+        t0 = time.time()
+        result = resample_file(path, args.bars, chunk_bytes=args.chunk_mb << 20, drop_flat=not args.keep_flat)
+        t1 = time.time()
+        peak = ''
+        if args.memory:
+            peak = ', peak {:.0f} MB'.format(tracemalloc.get_traced_memory()[1]/1e6)
+            tracemalloc.stop()
+
+        print('{}: {:,} rows in {:.2f}s ({:.2f}M rows/s{})'.format(
+            os.path.basename(path), result['rows'], t1-t0, result['rows']/(t1-t0)/1e6, peak))
+        for name, npy in result['tables'].items():
+            print('    {:<3} {:>9,} bars -> {}'.format(name, np.load(npy, mmap_mode='r').shape[1], npy))
@@ -0,0 +1,265 @@
+from custom_functions import *
+from nnfx import NNFX
+from datacache import source_checksum
+from indicatorcache import code_version
+from indicatorregistry import REGISTRY
+import BinaryGenerator
+import custom_functions
+import indicatorregistry
+import nnfx
+import numpy as np
+import sqlite3
+import argparse
+import datetime
+import hashlib
+import inspect
+import json
+import os
+
+# Persistent Store of Backtest Results
+#
+# Every run goes into a local SQLite database: its config (as JSON), a hash
+# of the config, a checksum of the data it ran on, the summary stats of
+# sweep.summarize, and the compact trade list and daily equity curve as
+# float64 blobs. A (config hash, data checksum) pair is only ever run once -
+# sweeps look up what is already stored and skip it - and the stats columns
+# are indexed for leaderboard queries.
+
+# Summary Stats Stored with Every Run (see sweep.summarize)
+STATS = ('final_value', 'pnl_net', 'trades', 'won', 'lost', 'sqn')
+
+# Params that Change how a Run is Shown or Timed but not its Result
+DISPLAY_PARAMS = ('oneplot', 'verbose', 'cache_dir', 'profile', 'journal')
+
+# Hash of the Strategy, Signal and Commission Sources, Worked out Once per Process
+_source_version = []
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    config_hash TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    pairs TEXT NOT NULL,
+    cash REAL NOT NULL,
+    created TEXT NOT NULL,
+    seconds REAL,
+    final_value REAL,
+    pnl_net REAL,
+    trades INTEGER,
+    won INTEGER,
+    lost INTEGER,
+    sqn REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS runs_key ON runs (config_hash, data_hash);
+CREATE INDEX IF NOT EXISTS runs_final_value ON runs (data_hash, final_value);
+CREATE INDEX IF NOT EXISTS runs_pnl_net ON runs (data_hash, pnl_net);
+CREATE INDEX IF NOT EXISTS runs_sqn ON runs (data_hash, sqn);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id),
+    trade_list BLOB,
+    dates BLOB,
+    equity BLOB
+);
+'''
+
+
+def full_config(config):
+    """
+    NNFX params of a run with every default filled in and the display-only params left out
+    """
+    params = dict(NNFX.params._getitems())
+    params.update(config)
+    return {k: v for k, v in params.items() if k not in DISPLAY_PARAMS}
+
+
+def code_versions(config):
+    """
+    Versions of the code a config runs: the code_version of each of its indicators (see
+    indicatorcache) and a hash of the strategy, signal builder and commission sources, so
+    editing any of them re-runs the config
+    """
+    params = full_config(config)
+    versions = []
+    for role in ('base', 'c1', 'c2', 'volume', 'exit'):
+        spec = REGISTRY.get(params[role + '_ind'])
+        if spec is not None:
+            versions.append(code_version(spec.resolve(params[role + '_params'])[0]))
+    if not _source_version:
+        sha = hashlib.sha1()
+        for module in (nnfx, indicatorregistry, BinaryGenerator, custom_functions):
+            sha.update(inspect.getsource(module).encode())
+        _source_version.append(sha.hexdigest())
+    return versions + _source_version
+
+
+def config_hash(config, pairs, cash):
+    """
+    Hash of everything that decides the result of a run, apart from the data
+    :param config: NNFX params dict (defaults are filled in, so {} and the defaults hash the same)
+    :param pairs: Pair names in feed order (the order matters to the strategy)
+    :param cash: Starting cash
+
+    """
+    items = sorted((k, repr(v)) for k, v in full_config(config).items())
+    return hashlib.sha1(repr((items, list(pairs), float(cash), code_versions(config))).encode()).hexdigest()
+
+
+def data_checksum(pairs, dpath='Data/', cache_dir='Data/cache/'):
+    """
+    Combined checksum of the CSVs of a list of pairs
+    """
+    paths, names = file_browser(dpath)
+    files = dict(zip(names, paths))
+    sha = hashlib.sha1()
+    for pair in pairs:
+        sha.update('{}:{};'.format(pair, source_checksum(dpath+files[pair], cache_dir)).encode())
+    return sha.hexdigest()
+
+
+def config_json(config):
+    # Indicator classes in the params (e.g. the MA type of ASH) are stored by name
+    return json.dumps(full_config(config), sort_keys=True,
+                      default=lambda v: v.__name__ if hasattr(v, '__name__') else repr(v))
+
+
+class ResultStore(object):
+
+    def __init__(self, path='Data/results.sqlite'):
+        """
+        Opens (and creates when missing) a result database
+        :param path: SQLite file
+
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def commit(self):
+        self.db.commit()
+
+    def known(self, data_hash):
+        """
+        Config hashes already stored for a data checksum
+        """
+        rows = self.db.execute('SELECT config_hash FROM runs WHERE data_hash = ?', (data_hash,))
+        return {row[0] for row in rows}
+
+    def summary(self, key, data_hash):
+        """
+        Summary stats of a stored run as a dict, with its id as 'run_id' (None if there is no such run)
+        """
+        row = self.db.execute('SELECT id AS run_id, {} FROM runs WHERE config_hash = ? AND data_hash = ?'.format(
+            ', '.join(STATS)), (key, data_hash)).fetchone()
+        return dict(row) if row is not None else None
+
+    def add(self, record, config, pairs, cash, data_hash, commit=True):
+        """
+        Stores a finished run, unless the same config already ran on the same data
+        :param record: Result record (see sweep.summarize), optionally with 'trade_list',
+                       'dates' and 'returns' (see sweep.run_config) and 'time'
+        :param config: NNFX params dict of the run
+        :param pairs: Pair names in feed order
+        :param cash: Starting cash
+        :param data_hash: Checksum of the data (see data_checksum)
+        :param commit: Commit right away (leave off to batch many runs into one transaction)
+        :return: Id of the new run, or None if it was already stored
+
+        """
+        cursor = self.db.execute(
+            'INSERT OR IGNORE INTO runs (config_hash, data_hash, config, pairs, cash, created, seconds, {}) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, {})'.format(', '.join(STATS), ', '.join('?' * len(STATS))),
+            (config_hash(config, pairs, cash), data_hash, config_json(config), json.dumps(list(pairs)), cash,
+             datetime.datetime.now().isoformat(timespec='seconds'), record.get('time'))
+            + tuple(record.get(s) for s in STATS))
+        if not cursor.rowcount:
+            return None
+
+        run_id = cursor.lastrowid
+        trades = np.array(record.get('trade_list', []), dtype=np.float64).reshape(-1, 4)
+        equity = cash * np.cumprod(1.0 + np.array(record.get('returns', []), dtype=np.float64))
+        self.db.execute('INSERT INTO series (run_id, trade_list, dates, equity) VALUES (?, ?, ?, ?)',
+                        (run_id, trades.tobytes(), np.array(record.get('dates', []), dtype=np.float64).tobytes(),
+                         equity.tobytes()))
+        if commit:
+            self.db.commit()
+        return run_id
+
+    def leaderboard(self, metric='final_value', top=20, data_hash=None, min_trades=0, ascending=False):
+        """
+        Best stored runs by a summary stat
+        :param metric: One of STATS
+        :param top: Number of runs returned
+        :param data_hash: Only runs on this data (see data_checksum)
+        :param min_trades: Leave out runs with fewer closed trades
+        :param ascending: Lowest first instead of highest
+        :return: List of dicts with the run id, its stats and its config (decoded)
+
+        """
+        if metric not in STATS:
+            raise ValueError('Unknown metric: {} (one of {})'.format(metric, ', '.join(STATS)))
+        where, args = ['trades >= ?', '{} IS NOT NULL'.format(metric)], [min_trades]
+        if data_hash is not None:
+            where.append('data_hash = ?')
+            args.append(data_hash)
+        rows = self.db.execute(
+            'SELECT id, config, pairs, cash, seconds, {} FROM runs WHERE {} ORDER BY {} {} LIMIT ?'.format(
+                ', '.join(STATS), ' AND '.join(where), metric, 'ASC' if ascending else 'DESC'),
+            args + [top])
+        board = []
+        for row in rows:
+            run = dict(row)
+            run['config'] = json.loads(run['config'])
+            run['pairs'] = json.loads(run['pairs'])
+            board.append(run)
+        return board
+
+    def get(self, run_id):
+        """
+        A stored run with its closed trades under 'trade_list' ((n, 4) array of dtopen,
+        dtclose, long, pnlcomm) and its daily equity curve under 'dates' and 'equity'
+        """
+        row = self.db.execute('SELECT * FROM runs JOIN series ON series.run_id = runs.id WHERE runs.id = ?',
+                              (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run['config'] = json.loads(run['config'])
+        run['pairs'] = json.loads(run['pairs'])
+        run['trade_list'] = np.frombuffer(run['trade_list'], dtype=np.float64).reshape(-1, 4)
+        run['dates'] = np.frombuffer(run['dates'], dtype=np.float64)
+        run['equity'] = np.frombuffer(run['equity'], dtype=np.float64)
+        return run
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Leaderboard of stored backtest runs')
+    parser.add_argument('--db', default='Data/results.sqlite', help='Result database')
+    parser.add_argument('--metric', default='final_value', choices=STATS, help='Stat to rank on')
+    parser.add_argument('--top', type=int, default=20, help='Runs shown')
+    parser.add_argument('--min-trades', type=int, default=0, help='Leave out runs with fewer trades')
+    args = parser.parse_args()
+
+    with ResultStore(args.db) as store:
+        for run in store.leaderboard(args.metric, args.top, min_trades=args.min_trades):
+            c = run['config']
+            print('{:>6} {:>12.2f} SQN: {:>6.2f} Trades: {:>4}  {} {} {} {} {} sl={}'.format(
+                run['id'], run['final_value'], run['sqn'] or 0.0, run['trades'],
+                c['base_ind'], c['c1_ind'], c['c2_ind'], c['volume_ind'], c['exit_ind'], c['sl']))
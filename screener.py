@@ -0,0 +1,390 @@
+import backtrader as bt
+from custom_functions import *
+from nnfx import NNFX, pip_size
+from signals import compute_signals, SignalData
+from sweep import param_grid, load_feeds
+from portfolio import conversion_feeds
+from shareddata import SharedFeeds, attach_feeds
+import numpy as np
+import multiprocessing
+import time
+
+# Vectorized NNFX Screening Backtester
+#
+# Replays the NNFX rules straight on the NumPy arrays of a pair (OHLC plus
+# the series from signals.compute_signals) without going through the broker.
+# Entry signals are evaluated for every bar at once; the exits of a trade are
+# found with array scans, so a pair costs one pass per trade. Results are in
+# R-multiples (PnL over the planned stop distance) compounded at the risk per
+# trade, which is what the strategy sizes positions on.
+#
+# Approximations against cerebro.run():
+#   - Pairs are simulated independently (NNFX only enters while flat on all pairs)
+#   - No margin checks or order rejections
+#   - The trailing stop left behind by an exit-indicator close is not modelled
+
+SLIPPAGE = 0.0001
+
+# Trade Record Layout
+TRADE_DTYPE = np.dtype([
+    ('signal', np.int64),  # bar the entry was decided on
+    ('entry', np.int64),   # bar the market order filled
+    ('exit', np.int64),    # bar the position was flat again
+    ('direction', np.float64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('r', np.float64),     # result in multiples of the planned stop distance
+    ('reason', 'U5'),      # stop, trail, exit or open
+])
+
+
+def shift(x, n, fill=0.0):
+    """
+    x shifted forward by n bars (x[t-n] at t), padded with fill
+    """
+    out = np.full_like(x, fill)
+    if n < len(x):
+        out[n:] = x[:len(x)-n]
+    return out
+
+
+def entry_signals(sig):
+    """
+    Direction NNFX would enter on at every bar if it were flat
+    :param sig: Dict of SIGNALS name -> array (see signals.compute_signals)
+    :return: Array of 1.0 (buy), -1.0 (sell) or 0.0
+
+    """
+    B, TF = sig['baseline'], sig['too_far']
+    C1, C2, V = sig['c1'], sig['c2'], sig['volume']
+    n = len(B)
+    t = np.arange(n)
+    cross = B != 0.0
+
+    # Baseline Conditions and Pullback Logic
+    base_up, base_dn = B > 0, B < 0
+    B1, TF1 = shift(B, 1), shift(TF, 1)
+    too_far = cross & (TF != 0.0)
+    pulled_back = cross & ~too_far & (B1 != 0.0) & (TF1 != 0.0)
+    base_up = np.where(too_far, False, np.where(pulled_back, B1 > 0, base_up))
+    base_dn = np.where(too_far, False, np.where(pulled_back, B1 < 0, base_dn))
+
+    buy = base_up & (C1 > 0) & (C2 > 0) & (V > 0)
+    sell = base_dn & (C1 < 0) & (C2 < 0) & (V < 0)
+
+    # Bridge Too Far: C1 must have been against the cross within the last 8 bars
+    first = np.full(n, 100)
+    for k in range(9, -1, -1):
+        first = np.where(shift(C1, k, np.nan) == -B, k, first)
+    blocked = cross & ((first - 1 > 7) | (t < 9))
+    buy &= ~blocked
+    sell &= ~blocked
+
+    direction = np.where(buy, 1.0, np.where(sell, -1.0, 0.0))
+
+    # Continuation: two C1 flips since the last baseline cross (within 30 bars)
+    last = np.maximum.accumulate(np.where(cross, t, -1))
+    valid = ~cross & (t >= 29) & (last >= 0) & (t - last <= 29)
+    lastc = np.where(last >= 0, last, 0)
+    up = C1 > 0
+    flips = np.concatenate(([0], np.cumsum(up[1:] != up[:-1])))
+    nup = np.cumsum(C1 == 1.0)
+    ndn = np.cumsum(C1 == -1.0)
+    # Counts over the window last+1..t
+    opposite = np.where(B[lastc] > 0, ndn - ndn[lastc], nup - nup[lastc])
+    cont = valid & (opposite > 0) & (flips - flips[np.minimum(lastc+1, n-1)] == 2)
+    cont &= (C2 == C1) & (np.abs(C1) == 1.0)
+    direction = np.where(cont, C1, direction)
+
+    return direction
+
+
+def _fill_market(d, o, h, l, slip):
+    # Market order at the open, slipped against the trade but kept inside the bar
+    return min(o*(1+slip), h) if d > 0 else max(o*(1-slip), l)
+
+
+def _fill_stop(d, level, o, h, l, slip):
+    # Stop closing a position of direction d, executed at the open on a gap
+    price = o if (o <= level if d > 0 else o >= level) else level
+    return max(price*(1-slip), l) if d > 0 else min(price*(1+slip), h)
+
+
+def _fill_limit(d, level, o, h, slip):
+    # Take-profit closing a position of direction d
+    if d > 0:
+        return max(o*(1-slip), level) if level <= o else level
+    return min(o*(1+slip), h, level) if level >= o else level
+
+
+def simulate(columns, sig, minperiod, sl=1.5, tp=3.0, spread=2.0, pip=0.0001, slip=SLIPPAGE):
+    """
+    Replays the NNFX entries and bracket exits on a single pair
+    :param columns: Feed columns (see ArrayData)
+    :param sig: Dict of SIGNALS name -> array (see signals.compute_signals)
+    :param minperiod: First bar (1-based) the strategy trades on
+    :param sl: Stop distance in ATRs
+    :param tp: Take-profit distance in ATRs (closes half the position)
+    :param spread: Round-trip spread in pips, charged as commission
+    :param pip: Pip size of the pair
+    :param slip: Fractional slippage on market and stop fills
+    :return: Array of TRADE_DTYPE records
+
+    """
+    o = np.asarray(columns['open'], dtype=np.float64)
+    h = np.asarray(columns['high'], dtype=np.float64)
+    l = np.asarray(columns['low'], dtype=np.float64)
+    c = np.asarray(columns['close'], dtype=np.float64)
+    atr = sig['atr']
+    n = len(c)
+
+    direction = entry_signals(sig)
+    # Any of exit, baseline, C1 or C2 against the position closes it
+    against_long = (sig['exit'] < 0) | (sig['baseline'] < 0) | (sig['c1'] < 0) | (sig['c2'] < 0)
+    against_short = (sig['exit'] > 0) | (sig['baseline'] > 0) | (sig['c1'] > 0) | (sig['c2'] > 0)
+
+    candidates = np.flatnonzero(direction[:n-1])
+    trades = []
+    t = max(minperiod - 1, 0)
+    while True:
+        i = np.searchsorted(candidates, t)
+        if i == len(candidates):
+            break
+        t = candidates[i]
+        d = direction[t]
+        f = t + 1
+        entry = _fill_market(d, o[f], h[f], l[f], slip)
+        dist = sl * atr[t]
+        stop = c[t] - d*dist
+        target = c[t] + d*tp*atr[t]
+
+        # Bracket children are live from the bar after the fill
+        if d > 0:
+            stop_hit = np.flatnonzero(l[f+1:] <= stop)
+            tp_hit = np.flatnonzero(h[f+1:] >= target)
+        else:
+            stop_hit = np.flatnonzero(h[f+1:] >= stop)
+            tp_hit = np.flatnonzero(l[f+1:] <= target)
+        js = f + 1 + stop_hit[0] if len(stop_hit) else n
+        jt = f + 1 + tp_hit[0] if len(tp_hit) else n
+
+        if js == n and jt == n:
+            # Still in the full position at the end of the data
+            pnl, e, price, reason = d*(c[-1] - entry), n-1, c[-1], 'open'
+        elif js <= jt:
+            # Stop is checked first and cancels the take-profit
+            price = _fill_stop(d, stop, o[js], h[js], l[js], slip)
+            pnl, e, reason = d*(price - entry), js, 'stop'
+        else:
+            half = d*(_fill_limit(d, target, o[jt], h[jt], slip) - entry)
+            # Remaining half: trailing stop from the take-profit bar on
+            trail = sl * atr[jt]
+            if d > 0:
+                levels = np.maximum.accumulate(c[jt:n-1]) - trail
+                trail_hit = np.flatnonzero(l[jt+1:] <= levels)
+            else:
+                levels = np.minimum.accumulate(c[jt:n-1]) + trail
+                trail_hit = np.flatnonzero(h[jt+1:] >= levels)
+            exit_hit = np.flatnonzero((against_long if d > 0 else against_short)[jt:n-1])
+            jr = jt + 1 + trail_hit[0] if len(trail_hit) else n
+            jx = jt + 1 + exit_hit[0] if len(exit_hit) else n
+
+            if jr == n and jx == n:
+                price, e, reason = c[-1], n-1, 'open'
+            elif jr <= jx:
+                price = _fill_stop(d, levels[jr-jt-1], o[jr], h[jr], l[jr], slip)
+                e, reason = jr, 'trail'
+            else:
+                price = _fill_market(-d, o[jx], h[jx], l[jx], slip)
+                e, reason = jx, 'exit'
+            pnl = 0.5*half + 0.5*d*(price - entry)
+
+        r = (pnl - spread*pip) / dist
+        trades.append((t, f, e, d, entry, price, r, reason))
+        if reason == 'open':
+            break
+        # Flat again - entries are looked for from the exit bar on
+        t = e
+
+    return np.array(trades, dtype=TRADE_DTYPE)
+
+
+def trade_stats(trades, risk=2.0):
+    """
+    Summary of a screened trade list, with equity compounded at risk% per trade
+    :return: Dict of scalars
+
+    """
+    closed = trades[trades['reason'] != 'open']
+    r = closed['r']
+    equity = np.prod(1.0 + r*risk/100.0) if len(r) else 1.0
+    sqn = np.sqrt(len(r)) * r.mean() / r.std(ddof=1) if len(r) > 1 and r.std(ddof=1) > 0 else 0.0
+    return dict(
+        trades=len(closed),
+        won=int((r > 0).sum()),
+        lost=int((r <= 0).sum()),
+        net_r=float(r.sum()),
+        equity=float(equity),
+        sqn=float(sqn),
+    )
+
+
+def screen_pair(name, columns, config):
+    """
+    Computes the NNFX series of a pair and screens them
+    :return: (trade array, stats dict)
+
+    """
+    p = dict(NNFX.params._getitems())
+    p.update(config)
+    sig, minperiod = compute_signals(columns, config)
+    trades = simulate(columns, sig, minperiod, sl=p['sl'], tp=p['tp'], pip=pip_size(name))
+    return trades, trade_stats(trades, p['risk'])
+
+
+def screen_config(config, feeds):
+    """
+    Screens a config over several pairs
+    :param config: NNFX params dict
+    :param feeds: Dict of pair name -> columns (see sweep.load_feeds)
+    :return: Stats over the trades of all pairs, with the per pair stats under 'pairs'
+
+    """
+    risk = config.get('risk', NNFX.params.risk)
+    pairs, results = dict(), []
+    for name, columns in feeds.items():
+        trades, pairs[name] = screen_pair(name, columns, config)
+        results.append(trades)
+    stats = trade_stats(np.concatenate(results), risk)
+    stats['pairs'] = pairs
+    return stats
+
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def _init_worker(spec):
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _screen_job(job):
+    i, config = job
+    record = dict(id=i, config=config, error=None)
+    t0 = time.time()
+    try:
+        record.update(screen_config(config, _worker_feeds))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['time'] = time.time() - t0
+    return record
+
+
+def screen(configs, pairs=None, dpath='Data/', processes=None, chunksize=1):
+    """
+    Screens every config across a pool of worker processes
+    :param configs: List of NNFX params dicts (see sweep.param_grid)
+    :param pairs: List of pair names (default all files in dpath)
+    :param dpath: Data folder
+    :param processes: Number of workers (default cpu count)
+    :param chunksize: Configs handed to a worker at a time
+    :return: Generator of result records in completion order, each tagged with its config index
+
+    """
+    jobs = list(enumerate(configs))
+    with SharedFeeds(pairs, dpath) as shared, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        for record in pool.imap_unordered(_screen_job, jobs, chunksize):
+            yield record
+
+
+def validate(name, columns, config, cash=1000.0, feeds=None):
+    """
+    Compares the screened trades of a single pair against a cerebro.run() of NNFX on it
+    :param name: Pair name
+    :param columns: Feed columns (see ArrayData)
+    :param config: NNFX params dict
+    :param cash: Starting cash of the backtest
+    :param feeds: Dict of pair name -> columns holding the conversion feeds of a pair not quoted
+                  in the account currency (see portfolio.conversion_feeds). The backtest sizes
+                  positions and converts PnL through them, and raises a ValueError for a pair
+                  it has no conversion path for
+    :return: Dict with the trade counts of both runs, how many trades match on entry bar
+             and direction, and how the exits of the matched trades differ
+
+    """
+    p = dict(NNFX.params._getitems())
+    p.update(config)
+    sig, minperiod = compute_signals(columns, config)
+    trades = simulate(columns, sig, minperiod, sl=p['sl'], tp=p['tp'], pip=pip_size(name))
+    trades = trades[trades['reason'] != 'open']
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker = bt.brokers.BackBroker(slip_perc=SLIPPAGE, slip_open=True)
+    cerebro.addstrategy(NNFX, trade_pairs=[name], **config)
+    columns = dict(columns)
+    columns.update(sig)
+    cerebro.adddata(SignalData(dataname=columns, signal_minperiod=minperiod), name=name)
+    # Feeds that Only Supply Exchange Rates
+    feeds = feeds or dict()
+    for other in conversion_feeds(name, set(feeds) | {name}, p['account_currency'])[1:]:
+        cerebro.adddata(ArrayData(dataname=feeds[other]), name=other)
+    cerebro.broker.setcash(cash)
+    cerebro.addanalyzer(TradeList, _name='trades')
+    strat = cerebro.run()[0]
+
+    dt = np.asarray(columns['datetime'])
+    bt_trades = dict()
+    for dtopen, dtclose, long, pnl in strat.analyzers.trades.get_analysis():
+        entry = int(np.searchsorted(dt, dtopen))
+        bt_trades[(entry, 1.0 if long else -1.0)] = (int(np.searchsorted(dt, dtclose)), pnl)
+    sc_trades = {(int(t['entry']), t['direction']): t for t in trades}
+
+    matched = [k for k in sc_trades if k in bt_trades]
+    exit_diff = np.array([sc_trades[k]['exit'] - bt_trades[k][0] for k in matched])
+    same_sign = sum((sc_trades[k]['r'] > 0) == (bt_trades[k][1] > 0) for k in matched)
+    return dict(
+        screen_trades=len(sc_trades),
+        backtest_trades=len(bt_trades),
+        matched=len(matched),
+        screen_only=len(sc_trades) - len(matched),
+        backtest_only=len(bt_trades) - len(matched),
+        same_exit=int((exit_diff == 0).sum()),
+        mean_exit_diff=float(np.abs(exit_diff).mean()) if len(matched) else 0.0,
+        same_outcome=int(same_sign),
+        final_value=cerebro.broker.getvalue() / cash,
+        screen_equity=trade_stats(trades, p['risk'])['equity'],
+    )
+
+
+if __name__ == '__main__':
+
+    pairs = ['EURUSD', 'USDJPY', 'EURJPY']
+    feeds = load_feeds(pairs)
+
+    # Divergence from the full backtest on the default config (crosses get
+    # their conversion pairs from feeds)
+    for name in pairs:
+        columns = feeds[name]
+        report = validate(name, columns, dict(), feeds=feeds)
+        print(name, ', '.join('{}: {}'.format(k, round(v, 3)) for k, v in report.items()))
+
+    configs = param_grid(
+        base=[('butter', (40, 3)), ('kijun', (26,))],
+        c1=[('schaff', (20, 50, 10, 0.5)), ('ssl', (20,))],
+        c2=[('itrend', (30,))],
+        volume=[('damiani', (13, 20, 40, 100, 1.4, True))],
+        exit=[('ssl', (20,)), ('dosc', (48,))],
+        sl=[1.5, 2.0],
+    )
+
+    t0 = time.time()
+    results = list(screen(configs, pairs=pairs))
+    t1 = time.time()
+
+    results.sort(key=lambda r: r.get('equity', 0.0), reverse=True)
+    for r in results:
+        print(r['id'], r['config']['base_ind'], r['config']['c1_ind'], r['config']['exit_ind'], r['config']['sl'],
+              'ERROR: '+r['error'] if r['error'] else 'Equity: %.3f SQN: %.2f Trades: %d' % (r['equity'], r['sqn'], r['trades']))
+    print('Screen Time: %.2fs for %d configs' % (t1-t0, len(results)))
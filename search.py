@@ -0,0 +1,265 @@
+import backtrader as bt
+from custom_functions import *
+from nnfx import NNFX
+from sweep import run_config
+from walkforward import slice_feeds
+from portfolio import conversion_feeds
+from shareddata import SharedFeeds, attach_feeds
+from benchmark import ROLE_CASES
+import numpy as np
+import multiprocessing
+import random
+import math
+import time
+
+# Successive Halving and Hyperband Search over the Indicator Catalogue
+#
+# Candidate configs are drawn from the role branches of IndicatorGenerator
+# (the representative params of benchmark.ROLE_CASES, with the main period
+# scaled up and down). Each round of successive halving runs every surviving
+# config on a budget - the first pairs of the list over the most recent
+# stretch of history - ranks them on SQN or net PnL and promotes the best
+# 1/eta of them to a budget eta times larger (more pairs and more history at
+# once), until the survivors run on every pair over the full history.
+# Hyperband runs several such brackets, trading more candidates against
+# smaller starting budgets.
+
+# NNFX Params of Each Role, and the IndicatorGenerator Branch the Role Draws From
+ROLE_PARAMS = {
+    'base': ('base_ind', 'base_params', 'baseline'),
+    'c1': ('c1_ind', 'c1_params', 'entry'),
+    'c2': ('c2_ind', 'c2_params', 'entry'),
+    'volume': ('volume_ind', 'volume_params', 'volume'),
+    'exit': ('exit_ind', 'exit_params', 'exit'),
+}
+
+# Multiples of the Main Period Tried for Every Indicator
+PERIOD_SCALES = (0.5, 1.0, 1.5)
+
+# Fewest Bars a Budget Runs on, so the Slowest Indicators still Warm up
+MIN_BARS = 500
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def scaled_params(params, scales=PERIOD_SCALES):
+    """
+    Variants of an indicator's params with the main period (its first integer param of 5 or
+    more) scaled, or just the params themselves if there is none
+    """
+    for i, p in enumerate(params):
+        if isinstance(p, int) and not isinstance(p, bool) and p >= 5:
+            return [params[:i] + (max(2, int(round(p * s))),) + params[i+1:] for s in scales]
+    return [params]
+
+
+def search_space(scales=PERIOD_SCALES):
+    """
+    Candidate (indicator, params) choices of every role
+    :return: Dict of role (keys of ROLE_PARAMS) -> list of (indicator, params) tuples
+
+    """
+    space = dict()
+    for role, (_, _, branch) in ROLE_PARAMS.items():
+        space[role] = [(ind, p) for b, ind, params in ROLE_CASES if b == branch for p in scaled_params(params, scales)]
+    return space
+
+
+def sample_configs(n, space=None, seed=0, **fixed):
+    """
+    Draws distinct random configs from a search space
+    :param n: Number of configs (fewer if the space is smaller)
+    :param space: Search space (see search_space)
+    :param seed: Random seed
+    :param fixed: Further NNFX params shared by every config
+    :return: List of NNFX params dicts
+
+    """
+    space = space or search_space()
+    rng = random.Random(seed)
+    size = np.prod([len(choices) for choices in space.values()])
+    configs, seen = [], set()
+    while len(configs) < min(n, size):
+        picks = {role: rng.randrange(len(choices)) for role, choices in space.items()}
+        key = tuple(sorted(picks.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        config = dict(fixed)
+        for role, i in picks.items():
+            ind_key, params_key, _ = ROLE_PARAMS[role]
+            config[ind_key], config[params_key] = space[role][i]
+        configs.append(config)
+    return configs
+
+
+def budgets(pairs, bars, rungs, eta=3):
+    """
+    Budget of every rung of a successive halving bracket
+    :param pairs: Pair names in the order they are added
+    :param bars: Bars of the full history
+    :param rungs: Number of rungs
+    :param eta: Budget growth between rungs (split evenly between pairs and history)
+    :return: List of (number of pairs, bars of history), the last one being everything
+
+    """
+    out = []
+    for i in range(rungs):
+        share = eta ** ((i - (rungs - 1)) / 2.0)
+        out.append((max(1, int(math.ceil(share * len(pairs)))), max(min(MIN_BARS, bars), int(share * bars))))
+    return out
+
+
+def _init_worker(spec):
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _run_job(job):
+    key, config, pairs, start, cash, account = job
+    record = dict(key=key, error=None)
+    try:
+        if config.get('account_currency', account) != account:
+            raise ValueError('Config account currency {} differs from the search account currency {}'.format(
+                config['account_currency'], account))
+        names = []
+        for pair in pairs:
+            names.extend(n for n in conversion_feeds(pair, _worker_feeds.keys(), account) if n not in names)
+        feeds = slice_feeds({n: _worker_feeds[n] for n in names}, start, float('inf'))
+        record.update(run_config(dict(config, trade_pairs=list(pairs), account_currency=account), feeds, cash))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    return record
+
+
+class Search(object):
+    '''
+    Runs successive halving brackets on a pool of workers attached to the shared feeds
+    '''
+
+    def __init__(self, pairs=None, dpath='Data/', metric='sqn', min_trades=5, cash=1000.0, processes=None,
+                 account_currency=NNFX.params.account_currency):
+        """
+        :param pairs: Pair names, in the order budgets add them (default all files in dpath)
+        :param dpath: Data folder
+        :param metric: Result key (see sweep.summarize) configs are ranked on, e.g. 'sqn' or 'pnl_net'
+        :param min_trades: Runs with fewer closed trades rank last (their SQN means little)
+        :param cash: Starting cash of every run
+        :param processes: Number of workers (default cpu count)
+        :param account_currency: Account currency of every run - the conversion feeds published are
+                                 the ones it needs, and configs setting another one are not run
+
+        """
+        self.pairs = list(pairs) if pairs is not None else sorted(file_browser(dpath)[1])
+        self.metric = metric
+        self.min_trades = min_trades
+        self.cash = cash
+        self.account_currency = account_currency
+        names = sorted(file_browser(dpath)[1])
+        needed = []
+        for pair in self.pairs:
+            needed.extend(n for n in conversion_feeds(pair, names, account_currency) if n not in needed)
+        self.shared = SharedFeeds(needed, dpath)
+        self.dt = np.array(self.shared.feeds[self.pairs[0]]['datetime'])
+        self.pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self.shared.spec,))
+        # Bars Run (Pairs x History) so far
+        self.cost = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shared.close()
+
+    def score(self, record):
+        if record['error'] or record['trades'] < self.min_trades or record[self.metric] is None:
+            return -float('inf')
+        return record[self.metric]
+
+    def evaluate(self, configs, n_pairs, bars):
+        """
+        Runs configs on the first n_pairs pairs over the last bars of history
+        :return: List of result records, in the order of configs
+
+        """
+        pairs = self.pairs[:n_pairs]
+        start = self.dt[max(0, len(self.dt) - bars)]
+        jobs = [(i, config, pairs, start, self.cash, self.account_currency) for i, config in enumerate(configs)]
+        records = [None] * len(configs)
+        for record in self.pool.imap_unordered(_run_job, jobs):
+            records[record.pop('key')] = record
+        self.cost += len(configs) * n_pairs * bars
+        return records
+
+    def successive_halving(self, configs, rungs=3, eta=3, first_rung=0):
+        """
+        Successive halving over a list of configs
+        :param configs: List of NNFX params dicts
+        :param rungs: Rungs of the full bracket (the last one runs on every pair and bar)
+        :param eta: Fraction of configs dropped (1 - 1/eta) and budget growth per rung
+        :param first_rung: Rung the configs start on (later rungs start on larger budgets)
+        :return: List of rungs, each a dict with the budget ('pairs', 'bars') and the configs
+                 it ran with their records ('results', best first)
+
+        """
+        plan = budgets(self.pairs, len(self.dt), rungs, eta)
+        history = []
+        survivors = list(configs)
+        for i in range(first_rung, rungs):
+            n_pairs, bars = plan[i]
+            records = self.evaluate(survivors, n_pairs, bars)
+            ranked = sorted(zip(survivors, records), key=lambda cr: self.score(cr[1]), reverse=True)
+            history.append(dict(pairs=n_pairs, bars=bars, results=ranked))
+            survivors = [config for config, record in ranked[:max(1, len(ranked) // eta)]]
+        return history
+
+    def hyperband(self, max_configs=81, rungs=3, eta=3, space=None, seed=0, **fixed):
+        """
+        Hyperband: successive halving brackets from many configs on small budgets to few
+        configs on the full budget, all drawn from the search space
+        :param max_configs: Configs of the most aggressive bracket
+        :param rungs: Rungs of a full bracket
+        :param eta: Halving rate
+        :param space: Search space (see search_space)
+        :param seed: Random seed of the config draws
+        :param fixed: Further NNFX params shared by every config
+        :return: Dict with the brackets (see successive_halving) under 'brackets' and the best
+                 full-budget (config, record) under 'best'
+
+        """
+        brackets = []
+        best = None
+        for s in reversed(range(rungs)):
+            n = int(math.ceil(max_configs * rungs / (s + 1.0) / eta ** (rungs - 1 - s)))
+            configs = sample_configs(n, space, seed + s, **fixed)
+            history = self.successive_halving(configs, rungs, eta, first_rung=rungs - 1 - s)
+            brackets.append(history)
+            top = history[-1]['results'][0]
+            if best is None or self.score(top[1]) > self.score(best[1]):
+                best = top
+        return dict(brackets=brackets, best=best)
+
+
+if __name__ == '__main__':
+
+    pairs = ['EURUSD', 'USDJPY', 'GBPUSD', 'AUDUSD', 'USDCAD', 'USDCHF', 'NZDUSD', 'EURJPY', 'GBPJPY']
+    t0 = time.time()
+    with Search(pairs, metric='sqn') as search:
+        configs = sample_configs(243)
+        rungs = search.successive_halving(configs, rungs=5, eta=3)
+        full_cost = len(configs) * len(pairs) * len(search.dt)
+        cost = search.cost
+    t1 = time.time()
+
+    for rung in rungs:
+        config, record = rung['results'][0]
+        print('{:>3} configs on {} pairs x {} bars - best {} {} {} {} {}: SQN {} Trades {}'.format(
+            len(rung['results']), rung['pairs'], rung['bars'], config['base_ind'], config['c1_ind'],
+            config['c2_ind'], config['volume_ind'], config['exit_ind'], record['sqn'], record['trades']))
+    print('Search Time: %.2fs - %.1f%% of the bars of an exhaustive run' % (t1-t0, 100.0*cost/full_cost))
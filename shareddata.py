@@ -0,0 +1,160 @@
+import backtrader as bt
+from custom_functions import *
+from datacache import COLUMNS, load_columns
+from multiprocessing import shared_memory
+import numpy as np
+import time
+
+# Shared-Memory Data Plane for Worker Pools
+#
+# The parent process copies the columns of every pair once into a single
+# multiprocessing.shared_memory block - one (len(COLUMNS), rows) float64
+# table per pair, back to back - and hands the workers a small picklable
+# spec (block name and the offset and length of every table). A worker
+# attaches to the block and gets read-only NumPy views on it, so the bars
+# exist once in memory however many workers run, and a worker starts up
+# without opening, checking or mapping any cache file.
+
+# Blocks this Process is Attached to, Until detach_feeds Releases them
+_attached = dict()
+
+
+class SharedFeeds(object):
+    '''
+    Publishes the feeds of a list of pairs in shared memory for the lifetime of the object
+    '''
+
+    def __init__(self, pairs=None, dpath='Data/', feeds=None):
+        """
+        :param pairs: List of pair names, in feed order (default all files in dpath)
+        :param dpath: Data folder
+        :param feeds: Dict of pair name -> columns to publish instead of loading pairs (e.g. resampled bars)
+
+        """
+        if feeds is None:
+            paths, names = file_browser(dpath)
+            files = dict(zip(names, paths))
+            feeds = {name: load_columns(dpath+files[name]) for name in (pairs if pairs is not None else sorted(names))}
+        rows = {name: len(columns['datetime']) for name, columns in feeds.items()}
+        size = max(1, sum(rows.values())) * len(COLUMNS) * 8
+        self.block = shared_memory.SharedMemory(create=True, size=size)
+
+        layout, offset = [], 0
+        for name, columns in feeds.items():
+            table = np.frombuffer(self.block.buf, dtype=np.float64, count=len(COLUMNS)*rows[name],
+                                  offset=offset).reshape(len(COLUMNS), rows[name])
+            for i, c in enumerate(COLUMNS):
+                table[i] = columns[c]
+            layout.append((name, offset, rows[name]))
+            offset += table.nbytes
+        # The Block only Closes Once no Array on it is Left
+        table = None
+
+        # Everything a Worker Needs to Attach (Picklable, a few Bytes per Pair)
+        self.spec = (self.block.name, tuple(layout))
+        self.feeds = views(self.block, self.spec[1])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Unlinks the block and unmaps it in this process (workers still attached keep their mapping until they exit)
+        :return: True once unmapped, False while views handed out of self.feeds are still alive - close
+                 again once they are gone
+
+        """
+        if self.block is None:
+            return True
+        if self.feeds is not None:
+            self.feeds = None
+            self.block.unlink()
+        try:
+            self.block.close()
+        except BufferError:
+            return False
+        self.block = None
+        return True
+
+
+def views(block, layout):
+    # Read-only column views of every table in a block. np.frombuffer holds an export of the
+    # buffer, so closing the block raises BufferError instead of unmapping live views
+    feeds = dict()
+    for name, offset, rows in layout:
+        table = np.frombuffer(block.buf, dtype=np.float64, count=len(COLUMNS)*rows,
+                              offset=offset).reshape(len(COLUMNS), rows)
+        table.flags.writeable = False
+        feeds[name] = dict(zip(COLUMNS, table))
+    return feeds
+
+
+def attach_feeds(spec):
+    """
+    Attaches to feeds published by a SharedFeeds
+    :param spec: The spec of the SharedFeeds
+    :return: Dict of pair name -> read-only column views, usable as ArrayData columns
+
+    """
+    name, layout = spec
+    if name not in _attached:
+        # Pool workers share the resource tracker of the publisher, so attaching registers
+        # nothing new and the block is still unlinked once, by SharedFeeds.close
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return views(_attached[name], layout)
+
+
+def detach_feeds(spec):
+    """
+    Releases the block attach_feeds mapped for a spec
+    :param spec: The spec of the SharedFeeds
+    :return: True once released, False while views on the block are still alive (it stays
+             attached, so detach again once they are gone)
+
+    """
+    block = _attached.get(spec[0])
+    if block is None:
+        return True
+    try:
+        block.close()
+    except BufferError:
+        return False
+    del _attached[spec[0]]
+    return True
+
+
+class SharedData(ArrayData):
+    '''
+    Data feed that replays a pair published by a SharedFeeds straight from shared memory.
+    Pass the pair name as dataname and the spec of the SharedFeeds as spec.
+    '''
+
+    params = (
+        ('spec', None),
+    )
+
+    def _columns(self):
+        return attach_feeds(self.p.spec)[self.p.dataname]
+
+    def stop(self):
+        super(SharedData, self).stop()
+        # Drop the Views and Release the Block - the Last Feed on it to Stop Succeeds
+        self._cols = None
+        detach_feeds(self.p.spec)
+
+
+if __name__ == '__main__':
+
+    t0 = time.time()
+    with SharedFeeds() as shared:
+        t1 = time.time()
+        feeds = attach_feeds(shared.spec)
+        t2 = time.time()
+        size = sum(c['datetime'].nbytes for c in feeds.values()) * len(COLUMNS) / 1e6
+        feeds = None
+        detach_feeds(shared.spec)
+    print('Published {} pairs ({:.1f}MB) in {:.2f}s, attached in {:.2f}ms'.format(
+        len(shared.spec[1]), size, t1-t0, (t2-t1)*1000))
@@ -0,0 +1,143 @@
+import backtrader as bt
+from custom_functions import *
+from shareddata import SharedFeeds, attach_feeds
+from indicatorcache import IndicatorCache
+from nnfx import NNFX, SIGNALS, build_signals
+import BinaryGenerator as BG
+import multiprocessing
+import numpy as np
+import time
+
+# Precomputed Signal Feeds
+#
+# The binary role series (baseline, too_far, c1, c2, volume, exit) and the
+# ATR that NNFX trades on only depend on their own pair, so they can be
+# evaluated up front, one pair per worker process, and handed to the
+# strategy as extra lines of the data feed. NNFX then only reads values.
+
+
+class SignalRecorder(bt.Strategy):
+    '''
+    Builds the NNFX series for a single feed so they can be read back as
+    arrays once the run is over. Takes the same params as NNFX.
+    '''
+
+    params = dict(NNFX.params._getitems())
+
+    def __init__(self):
+        self.cache = IndicatorCache(self.p.cache_dir) if self.p.cache_dir else None
+        self.ig = BG.IndicatorGenerator(self.data, cache=self.cache)
+        self.series = build_signals(self.ig, self.p)
+
+    def stop(self):
+        if self.cache is not None:
+            self.ig.save_cache()
+
+
+def compute_signals(columns, config):
+    """
+    Evaluates the NNFX series of a single pair
+    :param columns: Feed columns (see ArrayData)
+    :param config: NNFX params dict
+    :return: (Dict of SIGNALS name -> array, minimum period of the series)
+
+    """
+    cerebro = bt.Cerebro(stdstats=False, runonce=True)
+    cerebro.adddata(ArrayData(dataname=columns))
+    cerebro.addstrategy(SignalRecorder, **config)
+    strat = cerebro.run()[0]
+
+    arrays = {name: np.array(strat.series[name].array, dtype=np.float64) for name in SIGNALS}
+    return arrays, strat._minperiod
+
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def _init_worker(spec):
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _compute_pair(job):
+    name, config = job
+    return name, compute_signals(_worker_feeds[name], config)
+
+
+def precompute_signals(config, pairs=None, dpath='Data/', processes=None):
+    """
+    Evaluates the NNFX series of every pair in parallel
+    :param config: NNFX params dict
+    :param pairs: List of pair names, in feed order (default all files in dpath)
+    :param dpath: Data folder
+    :param processes: Number of workers (default cpu count)
+    :return: Dict of pair name -> SignalData-ready columns (OHLCV plus SIGNALS) and minimum period
+
+    """
+    pairs = list(pairs) if pairs is not None else sorted(file_browser(dpath)[1])
+    jobs = [(name, config) for name in pairs]
+
+    feeds = dict()
+    with SharedFeeds(pairs, dpath) as shared, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        results = dict(pool.map(_compute_pair, jobs))
+
+        # Own Copies of the Bars, the Block Goes with the Pool
+        for name in pairs:
+            arrays, minperiod = results[name]
+            columns = {c: np.array(v) for c, v in shared.feeds[name].items()}
+            columns.update(arrays)
+            feeds[name] = (columns, minperiod)
+    return feeds
+
+
+class SignalData(ArrayData):
+    '''
+    ArrayData carrying the precomputed NNFX series as extra lines (named
+    <series>_sig, e.g. c1_sig). Pass the columns and minimum period returned
+    by precompute_signals.
+    '''
+
+    lines = tuple(name + '_sig' for name in SIGNALS)
+
+    params = (
+        ('signal_minperiod', 1),
+    )
+
+    def start(self):
+        super(SignalData, self).start()
+        # With no indicators on the feed the strategy waits on the feed's own
+        # minimum period, which stands in for the warm-up of the series
+        self._minperiod = self.p.signal_minperiod
+
+    def _load(self):
+        if not super(SignalData, self)._load():
+            return False
+
+        i = self._idx - 1
+        for name in SIGNALS:
+            getattr(self.lines, name + '_sig')[0] = float(self._cols[name][i])
+        return True
+
+
+if __name__ == '__main__':
+
+    pairs = ['EURUSD', 'USDJPY', 'EURJPY']
+    config = dict()
+
+    t0 = time.time()
+    feeds = precompute_signals(config, pairs)
+    t1 = time.time()
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker = bt.brokers.BackBroker(slip_perc=0.0001, slip_open=True)
+    cerebro.addstrategy(NNFX, **config)
+    for name, (columns, minperiod) in feeds.items():
+        cerebro.adddata(SignalData(dataname=columns, signal_minperiod=minperiod), name=name)
+    cerebro.broker.setcash(1000.0)
+    cerebro.run()
+    t2 = time.time()
+
+    print('Final Portfolio Value: %.2f' % cerebro.broker.getvalue())
+    print('Signal Time: %.2fs, Backtest Time: %.2fs' % (t1-t0, t2-t1))
@@ -0,0 +1,204 @@
+import backtrader as bt
+from custom_functions import *
+from nnfx import NNFX, lean_cerebro
+from datacache import load_columns
+from resultstore import ResultStore, config_hash, data_checksum
+from shareddata import SharedFeeds, attach_feeds
+import multiprocessing
+import itertools
+import time
+
+# Parallel Parameter Sweeps over the NNFX Strategy
+
+# Roles whose values are (indicator, params) pairs in a grid
+ROLES = {
+    'base': ('base_ind', 'base_params'),
+    'c1': ('c1_ind', 'c1_params'),
+    'c2': ('c2_ind', 'c2_params'),
+    'volume': ('volume_ind', 'volume_params'),
+    'exit': ('exit_ind', 'exit_params'),
+}
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def param_grid(**grid):
+    """
+    Expands a grid of NNFX parameters into a list of strategy param dicts
+    :param grid: NNFX param name -> list of values. The roles base, c1, c2, volume and exit
+                 take a list of (indicator, params) tuples, e.g. c1=[('schaff',(20,50,10,0.5))]
+    :return: List of dicts that can be passed straight to NNFX
+
+    """
+    keys = list(grid.keys())
+    configs = []
+    for values in itertools.product(*[grid[k] for k in keys]):
+        config = dict()
+        for key, value in zip(keys, values):
+            if key in ROLES:
+                ind_key, params_key = ROLES[key]
+                config[ind_key], config[params_key] = value
+            else:
+                config[key] = value
+        configs.append(config)
+    return configs
+
+
+def load_feeds(pairs=None, dpath='Data/'):
+    """
+    Maps the columnar cache of the CSVs in the data folder (building it on first use)
+    :param pairs: List of pair names to load, in feed order (default all files in dpath)
+    :param dpath: Data folder
+    :return: Dict of pair name -> columns for ArrayData
+
+    """
+    paths, names = file_browser(dpath)
+    files = dict(zip(names, paths))
+    feeds = dict()
+    for name in (pairs if pairs is not None else sorted(names)):
+        feeds[name] = load_columns(dpath+files[name])
+    return feeds
+
+
+def summarize(strategy, broker):
+    """
+    Reduces a finished strategy to a compact record of scalars
+    """
+    ta = strategy.analyzers.ta.get_analysis()
+    sqn = strategy.analyzers.sqn.get_analysis()
+    total = ta.get('total', {})
+    return dict(
+        final_value=broker.getvalue(),
+        pnl_net=ta.get('pnl', {}).get('net', {}).get('total', 0.0),
+        trades=total.get('closed', 0),
+        won=ta.get('won', {}).get('total', 0),
+        lost=ta.get('lost', {}).get('total', 0),
+        sqn=sqn.get('sqn', 0.0),
+    )
+
+
+def run_config(config, feeds, cash=1000.0, lean=False, details=False):
+    """
+    Runs a single NNFX backtest over pre-parsed feeds
+    :param config: NNFX params dict
+    :param feeds: Dict of pair name -> columns (see load_feeds)
+    :param cash: Starting cash
+    :param lean: Bounded-memory run (see nnfx.lean_cerebro)
+    :param details: Also return the closed trades as (dtopen, dtclose, long, pnlcomm) tuples
+                    under 'trade_list' and the daily returns under 'dates' and 'returns'
+    :return: Compact result record (see summarize)
+
+    """
+    cerebro = lean_cerebro() if lean else bt.Cerebro(stdstats=False)
+    cerebro.broker = bt.brokers.BackBroker(slip_perc=0.0001, slip_open=True)
+    cerebro.addstrategy(NNFX, **config)
+    for name, columns in feeds.items():
+        cerebro.adddata(ArrayData(dataname=columns), name=name)
+    cerebro.broker.setcash(cash)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
+    cerebro.addanalyzer(bt.analyzers.SQN, _name="sqn")
+    if details:
+        cerebro.addanalyzer(TradeList, _name="trades")
+        cerebro.addanalyzer(bt.analyzers.TimeReturn, _name="returns", timeframe=bt.TimeFrame.Days)
+
+    strategies = cerebro.run()
+    record = summarize(strategies[0], cerebro.broker)
+    if details:
+        record['trade_list'] = list(strategies[0].analyzers.trades.get_analysis())
+        returns = strategies[0].analyzers.returns.get_analysis()
+        record['dates'] = [bt.date2num(dt) for dt in returns.keys()]
+        record['returns'] = list(returns.values())
+    return record
+
+
+def _init_worker(spec):
+    # Attach to the shared data a single time for every run this worker handles
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _run_job(job):
+    i, config, cash, lean, details = job
+    record = dict(id=i, config=config, error=None)
+    t0 = time.time()
+    try:
+        record.update(run_config(config, _worker_feeds, cash, lean, details))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['time'] = time.time() - t0
+    return record
+
+
+def sweep(configs, pairs=None, dpath='Data/', cash=1000.0, processes=None, chunksize=1, lean=False, store=None,
+          batch=100):
+    """
+    Runs every config across a pool of worker processes with warm, preloaded feeds
+    :param configs: List of NNFX params dicts (see param_grid)
+    :param pairs: List of pair names to trade, in feed order (default all files in dpath)
+    :param dpath: Data folder
+    :param cash: Starting cash for each run
+    :param processes: Number of workers (default cpu count)
+    :param chunksize: Configs handed to a worker at a time
+    :param lean: Bounded-memory runs (see nnfx.lean_cerebro)
+    :param store: Optional resultstore.ResultStore - configs it already holds for the same
+                  data are not run again (their stored stats are yielded, flagged 'stored'),
+                  and every new run is saved to it with its trades and equity curve
+    :param batch: Runs saved per store transaction
+    :return: Generator of result records in completion order, each tagged with its config index
+
+    """
+    jobs, stored = [], []
+    if store is not None:
+        pairs = list(pairs) if pairs is not None else sorted(file_browser(dpath)[1])
+        data_hash = data_checksum(pairs, dpath)
+        known = store.known(data_hash)
+    for i, config in enumerate(configs):
+        if store is not None and config_hash(config, pairs, cash) in known:
+            stored.append(i)
+        else:
+            jobs.append((i, config, cash, lean, store is not None))
+
+    for i in stored:
+        record = dict(id=i, config=configs[i], error=None, stored=True)
+        record.update(store.summary(config_hash(configs[i], pairs, cash), data_hash))
+        yield record
+
+    if not jobs:
+        return
+    with SharedFeeds(pairs, dpath) as shared, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        for n, record in enumerate(pool.imap_unordered(_run_job, jobs, chunksize)):
+            if store is not None:
+                if not record['error']:
+                    store.add(record, record['config'], pairs, cash, data_hash, commit=False)
+                if n % batch == batch - 1:
+                    store.commit()
+                # The series only matter to the store
+                for key in ('trade_list', 'dates', 'returns'):
+                    record.pop(key, None)
+            yield record
+    if store is not None:
+        store.commit()
+
+
+if __name__ == '__main__':
+
+    configs = param_grid(
+        base=[('butter', (40, 3)), ('kijun', (26,))],
+        c1=[('schaff', (20, 50, 10, 0.5)), ('ssl', (20,))],
+        c2=[('itrend', (30,))],
+        volume=[('damiani', (13, 20, 40, 100, 1.4, True))],
+        exit=[('ssl', (20,)), ('dosc', (48,))],
+    )
+
+    t0 = time.time()
+    with ResultStore() as store:
+        results = list(sweep(configs, pairs=['EURUSD', 'USDJPY', 'EURJPY'], store=store))
+    t1 = time.time()
+
+    results.sort(key=lambda r: r.get('final_value', 0.0), reverse=True)
+    for r in results:
+        print(r['id'], r['config']['base_ind'], r['config']['c1_ind'], r['config']['exit_ind'],
+              'ERROR: '+r['error'] if r['error'] else 'Final Value: %.2f SQN: %.2f' % (r['final_value'], r['sqn']))
+    print('Sweep Time: %.2fs for %d runs (%d already stored)' % (t1-t0, len(results), sum(r.get('stored', False) for r in results)))
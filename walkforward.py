@@ -0,0 +1,241 @@
+import backtrader as bt
+from custom_functions import *
+from nnfx import NNFX, config_warmup
+from sweep import param_grid, load_feeds, summarize
+from shareddata import SharedFeeds, attach_feeds
+import numpy as np
+import multiprocessing
+import time
+
+# Walk-Forward Optimization of the NNFX Strategy
+#
+# The history is cut into folds of an in-sample window, on which every
+# candidate config is backtested, followed by an out-of-sample window that
+# the best in-sample config is then run on. Anchored folds keep the start of
+# the in-sample window fixed, rolling folds move it along. Every backtest only
+# gets its window of the data plus a warm-up stretch for the indicators, and
+# all (fold, config) runs go through a process pool. The out-of-sample
+# returns of the folds are chained into a single equity curve.
+
+# Warm-up of Configs whose Indicators do not Declare One (see nnfx.config_warmup)
+DEFAULT_WARMUP = 250
+
+
+class WindowNNFX(NNFX):
+    '''
+    NNFX that lets the indicators warm up on the bars before trade_start
+    and only trades from there on
+    '''
+
+    params = dict(
+        trade_start=0.0,
+    )
+
+    def next(self):
+        if self.datas[0].datetime[0] < self.p.trade_start:
+            return
+        super(WindowNNFX, self).next()
+
+
+def make_folds(dt, train, test, anchored=False, step=None, warmup=DEFAULT_WARMUP):
+    """
+    Splits a datetime column into walk-forward folds
+    :param dt: Reference datetime column (backtrader date numbers)
+    :param train: In-sample bars
+    :param test: Out-of-sample bars
+    :param anchored: Keep the in-sample start at the first bar (else roll it forward)
+    :param step: Bars between folds (default test, so the out-of-sample windows tile)
+    :param warmup: Bars loaded ahead of a window for the indicators to settle (the longest
+                   warm-up of the configs run on the folds)
+    :return: List of dicts with the datetimes bounding the in-sample (is_load, is_start,
+             is_end) and out-of-sample (oos_load, oos_start, oos_end) windows, where
+             the _load datetimes are the first warm-up bars, and the positions of the
+             first bars of the windows in dt (is_index, oos_index)
+
+    """
+    step = step or test
+    n = len(dt)
+    folds = []
+    is_start = warmup
+    oos_start = is_start + train
+    while oos_start < n:
+        oos_end = min(oos_start + test, n)
+        first = warmup if anchored else is_start
+        folds.append(dict(
+            is_load=dt[first - warmup],
+            is_start=dt[first],
+            is_end=dt[oos_start - 1],
+            oos_load=dt[oos_start - warmup],
+            oos_start=dt[oos_start],
+            oos_end=dt[oos_end - 1],
+            is_index=first,
+            oos_index=oos_start,
+        ))
+        is_start += step
+        oos_start += step
+    return folds
+
+
+def slice_feeds(feeds, start, end):
+    """
+    Zero-copy views of the feed columns between two datetimes (both included)
+    """
+    sliced = dict()
+    for name, columns in feeds.items():
+        dt = np.asarray(columns['datetime'])
+        lo, hi = np.searchsorted(dt, start), np.searchsorted(dt, end, side='right')
+        sliced[name] = {k: v[lo:hi] for k, v in columns.items()}
+    return sliced
+
+
+def run_window(config, feeds, load_start, trade_start, end, cash=1000.0):
+    """
+    Runs NNFX over a window of the feeds
+    :param config: NNFX params dict
+    :param feeds: Dict of pair name -> columns (see sweep.load_feeds)
+    :param load_start: First bar fed to the indicators
+    :param trade_start: First bar the strategy trades on
+    :param end: Last bar of the window
+    :param cash: Starting cash
+    :return: Compact result record (see sweep.summarize) plus the daily returns
+             from trade_start on as 'dates' and 'returns' lists
+
+    """
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker = bt.brokers.BackBroker(slip_perc=0.0001, slip_open=True)
+    cerebro.addstrategy(WindowNNFX, trade_start=trade_start, **config)
+    for name, columns in slice_feeds(feeds, load_start, end).items():
+        cerebro.adddata(ArrayData(dataname=columns), name=name)
+    cerebro.broker.setcash(cash)
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
+    cerebro.addanalyzer(bt.analyzers.SQN, _name="sqn")
+    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name="returns", timeframe=bt.TimeFrame.Days)
+
+    strategies = cerebro.run()
+    record = summarize(strategies[0], cerebro.broker)
+    returns = [(bt.date2num(dt), r) for dt, r in strategies[0].analyzers.returns.get_analysis().items()]
+    record['dates'] = [dt for dt, r in returns if dt >= int(trade_start)]
+    record['returns'] = [r for dt, r in returns if dt >= int(trade_start)]
+    return record
+
+
+# Feeds Attached Once per Worker Process (see shareddata)
+_worker_feeds = None
+
+
+def _init_worker(spec):
+    global _worker_feeds
+    _worker_feeds = attach_feeds(spec)
+
+
+def _run_job(job):
+    key, config, window, cash = job
+    record = dict(key=key, error=None)
+    try:
+        record.update(run_window(config, _worker_feeds, *window, cash=cash))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    return record
+
+
+def walk_forward(configs, pairs=None, train=500, test=125, anchored=False, step=None, warmup=None,
+                 score='final_value', dpath='Data/', cash=1000.0, processes=None):
+    """
+    Walk-forward optimization of NNFX over a list of candidate configs
+    :param configs: List of NNFX params dicts (see sweep.param_grid)
+    :param pairs: List of pair names to trade, in feed order (default all files in dpath)
+    :param train: In-sample bars per fold
+    :param test: Out-of-sample bars per fold
+    :param anchored: Anchored (growing) instead of rolling in-sample windows
+    :param step: Bars between folds (default test)
+    :param warmup: Bars loaded ahead of every window for indicator warm-up (default worked out for
+                   every config from its indicators, see nnfx.config_warmup)
+    :param score: Result key (see sweep.summarize) the in-sample runs are ranked on
+    :param dpath: Data folder
+    :param cash: Starting cash of every run
+    :param processes: Number of workers (default cpu count)
+    :return: Dict with the fold records under 'folds' and the stitched out-of-sample
+             equity curve under 'dates' and 'equity'
+
+    """
+    feeds = load_feeds(pairs, dpath)
+    pairs = list(feeds.keys())
+    dt = np.asarray(feeds[pairs[0]]['datetime'])
+
+    # Every Config Loads its own Warm-Up, the Windows Leave Room for the Longest
+    warmups = [warmup if warmup is not None else config_warmup(config) or DEFAULT_WARMUP for config in configs]
+    folds = make_folds(dt, train, test, anchored, step, max(warmups))
+
+    with SharedFeeds(feeds=feeds) as shared, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+        # In-Sample: Every Config on Every Fold
+        jobs = []
+        for i, fold in enumerate(folds):
+            for j, config in enumerate(configs):
+                window = (dt[fold['is_index'] - warmups[j]], fold['is_start'], fold['is_end'])
+                jobs.append(((i, j), config, window, cash))
+        for record in pool.imap_unordered(_run_job, jobs):
+            i, j = record['key']
+            if record['error']:
+                continue
+            # Ties go to the earlier config so the pick does not depend on completion order
+            best = folds[i].get('is_result')
+            if best is None or (record[score], -j) > (best[score], -best['key'][1]):
+                folds[i]['is_result'] = record
+                folds[i]['config'] = configs[j]
+                folds[i]['warmup'] = warmups[j]
+
+        # Out-of-Sample: Best Config of Every Fold
+        jobs = []
+        for i, fold in enumerate(folds):
+            if 'config' not in fold:
+                continue
+            window = (dt[fold['oos_index'] - fold['warmup']], fold['oos_start'], fold['oos_end'])
+            jobs.append((i, fold['config'], window, cash))
+        for record in pool.imap_unordered(_run_job, jobs):
+            folds[record['key']]['oos_result'] = record
+
+    # Stitch the Out-of-Sample Returns into One Curve
+    dates, returns = [], []
+    for fold in folds:
+        for record in (fold.get('is_result'), fold.get('oos_result')):
+            if record is not None:
+                record.pop('key', None)
+        oos = fold.get('oos_result')
+        if oos and not oos['error']:
+            dates.extend(oos.pop('dates'))
+            returns.extend(oos.pop('returns'))
+        if fold.get('is_result'):
+            fold['is_result'].pop('dates', None)
+            fold['is_result'].pop('returns', None)
+
+    return dict(
+        folds=folds,
+        dates=np.array(dates),
+        equity=cash * np.cumprod(1.0 + np.array(returns)),
+    )
+
+
+if __name__ == '__main__':
+
+    configs = param_grid(
+        base=[('butter', (40, 3)), ('kijun', (26,))],
+        c1=[('schaff', (20, 50, 10, 0.5)), ('ssl', (20,))],
+        sl=[1.5, 2.0],
+    )
+
+    t0 = time.time()
+    wf = walk_forward(configs, pairs=['EURUSD', 'USDJPY', 'EURJPY'], train=750, test=250)
+    t1 = time.time()
+
+    for i, fold in enumerate(wf['folds']):
+        config, oos = fold.get('config', {}), fold.get('oos_result', {})
+        print('Fold {} IS {} - OOS {} to {}: {} {} sl={} -> OOS Value: {:.2f}'.format(
+            i,
+            bt.num2date(fold['is_start']).date(),
+            bt.num2date(fold['oos_start']).date(),
+            bt.num2date(fold['oos_end']).date(),
+            config.get('base_ind'), config.get('c1_ind'), config.get('sl'),
+            oos.get('final_value', float('nan'))))
+    print('Stitched OOS Final Value: %.2f' % (wf['equity'][-1] if len(wf['equity']) else float('nan')))
+    print('Walk-Forward Time: %.2fs for %d folds x %d configs' % (t1-t0, len(wf['folds']), len(configs)))